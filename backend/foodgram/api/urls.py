@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from meals.async_views import async_routes
 from meals.views import (
     FavoriteViewSet,
     ProductViewSet,
@@ -44,12 +45,12 @@ router_v1.register(
     basename='shopping_cart'
 )
 
-urlpatterns = [
+urlpatterns = async_routes([
     path('users/set_password/', change_password, name='change_password'),
     path(
         'recipes/download_shopping_cart/',
         download_shopping_cart, name='download_shopping_cart'
     ),
-    path("", include(router_v1.urls)),
+    path("", include(async_routes(router_v1.urls))),
     path('auth/', include('djoser.urls.authtoken')),
-]
+])
@@ -0,0 +1,75 @@
+from foodgram.middleware import current_query_stats
+
+from .pool import get_pool
+
+
+class DatabaseWrapperMixin:
+    """Connection health checks and an optional pool of connections
+
+    CONN_HEALTH_CHECKS works as in Django 4.1: a reused connection is
+    checked before its first query in a request and replaced if the
+    database has dropped it. With POOL = {'MAX_SIZE': ..., 'TIMEOUT': ...}
+    closing a connection returns it to a pool of the process instead, and
+    the next connect takes it from there.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get(
+            'CONN_HEALTH_CHECKS', False
+        )
+        self.health_check_done = False
+
+    def get_pool(self):
+        return get_pool(self)
+
+    def check_connection(self, connection):
+        """Raise if the raw connection does not work"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, waited = pool.checkout(
+            lambda: super(DatabaseWrapperMixin, self).get_new_connection(
+                conn_params
+            ),
+            check=self.check_connection if self.health_check_enabled
+            else None
+        )
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.pool_wait += waited
+        return connection
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None:
+            return super()._close()
+        pool.checkin(self.connection)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        """Close a reused connection the database no longer accepts"""
+        if (self.connection is None or not self.health_check_enabled
+                or self.health_check_done):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
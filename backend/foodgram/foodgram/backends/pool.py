@@ -0,0 +1,121 @@
+import threading
+import time
+
+from django.db import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Thread-safe pool of open database connections
+
+    At most max_size connections are open, checkout() waits up to
+    timeout seconds for one to be returned when all are in use.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = []
+        self.checked_out = 0
+        self.opened = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.condition = threading.Condition()
+
+    def checkout(self, connect, check=None):
+        """Take an idle connection or open a new one
+
+        Returns the connection and the seconds spent waiting for it. An
+        idle connection that fails check() is closed and replaced.
+        """
+        start = time.perf_counter()
+        with self.condition:
+            if not self.idle and self.checked_out >= self.max_size:
+                self.waits += 1
+            while not self.idle and self.checked_out >= self.max_size:
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise OperationalError(
+                        f'No free database connection in {self.timeout}s, '
+                        f'all {self.max_size} are in use'
+                    )
+            waited = time.perf_counter() - start
+            self.wait_time += waited
+            self.checked_out += 1
+            connection = self.idle.pop() if self.idle else None
+        try:
+            if connection is not None and check is not None:
+                try:
+                    check(connection)
+                except Exception:
+                    self.discard(connection)
+                    connection = None
+            if connection is None:
+                connection = connect()
+                with self.condition:
+                    self.opened += 1
+        except BaseException:
+            self.release(None)
+            raise
+        return connection, waited
+
+    def checkin(self, connection):
+        """Return the connection, rolled back, to the idle ones"""
+        try:
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            connection = None
+        self.release(connection)
+
+    def release(self, connection):
+        with self.condition:
+            self.checked_out -= 1
+            if connection is not None:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.condition:
+            return {
+                'checked_out': self.checked_out,
+                'idle': len(self.idle),
+                'max_size': self.max_size,
+                'opened': self.opened,
+                'waits': self.waits,
+                'wait_ms': round(self.wait_time * 1000, 2),
+            }
+
+
+def get_pool(wrapper):
+    """Pool of the database of the wrapper, None without POOL settings"""
+    options = wrapper.settings_dict.get('POOL')
+    if not options or not options.get('MAX_SIZE'):
+        return None
+    # The test runner changes NAME of the same alias
+    key = (
+        wrapper.alias,
+        wrapper.settings_dict['NAME'],
+        wrapper.settings_dict['HOST'],
+        wrapper.settings_dict['PORT'],
+    )
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(
+                options['MAX_SIZE'], options.get('TIMEOUT', 30)
+            ))
+    return pool
+
+
+def pool_stats():
+    """Gauges and waits of the pools of this process by database alias"""
+    return {key[0]: pool.stats() for key, pool in list(_pools.items())}
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from ..base import DatabaseWrapperMixin
+
+
+class DatabaseWrapper(DatabaseWrapperMixin, base.DatabaseWrapper):
+    """PostgreSQL backend with health checks and a connection pool"""
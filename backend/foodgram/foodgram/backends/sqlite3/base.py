@@ -0,0 +1,16 @@
+from django.db.backends.sqlite3 import base
+
+from ..base import DatabaseWrapperMixin
+
+
+class DatabaseWrapper(DatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite backend with health checks and a connection pool
+
+    A stand-in for the PostgreSQL backend in local checks, a pool only
+    works with a database file.
+    """
+
+    def get_pool(self):
+        if self.is_in_memory_db():
+            return None
+        return super().get_pool()
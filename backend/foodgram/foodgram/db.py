@@ -0,0 +1,27 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .middleware import current_query_stats, record_queries
+
+
+def database_sync_to_async(func):
+    """sync_to_async for database work of async views
+
+    Django 3.2 has no async ORM and runs the sync parts of all requests in
+    one shared thread. func runs in a thread of the executor instead. The
+    connections of that thread are checked before and after func as at the
+    start and the end of a request, its queries are recorded by
+    QueryStatsMiddleware.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            with record_queries(current_query_stats.get()):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
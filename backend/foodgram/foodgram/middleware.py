@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .backends.pool import pool_stats
+
+logger = logging.getLogger('foodgram.queries')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+# Statistics of the current request, for queries run in other threads
+# and for the connection pool
+current_query_stats = ContextVar('current_query_stats', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its declared budget"""
+
+
+def query_budget(queries=None, **actions):
+    """Declare how many queries a view may run
+
+    Decorates a view function, a view set action or a view set class.
+    On a class, keyword arguments set budgets of single actions:
+    query_budget(8, create=20).
+    """
+    def decorator(view):
+        view.query_budget = {None: queries, **actions}
+        return view
+    return decorator
+
+
+def get_query_budget(view_func, method):
+    """Budget declared for the view or for the action the method maps to"""
+    view_class = getattr(view_func, 'cls', None)
+    action = getattr(view_func, 'actions', None) or {}
+    action = action.get(method.lower())
+    for target in (getattr(view_class, action or '', None), view_class,
+                   view_func):
+        budget = getattr(target, 'query_budget', None)
+        if budget:
+            return budget.get(action, budget[None])
+    return None
+
+
+def fingerprint(sql):
+    """SQL with literals and placeholder lists folded"""
+    return PLACEHOLDER_LISTS.sub('(%s, ...)', LITERALS.sub('?', sql))
+
+
+class QueryStats:
+    """Execute wrapper that counts and times the queries
+
+    With statements on it also counts every SQL text, for duplicates.
+    """
+
+    def __init__(self, statements=True):
+        self.count = 0
+        self.duration = 0.0
+        self.pool_wait = 0.0
+        self.statements = Counter() if statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            if self.statements is not None:
+                self.statements[sql] += 1
+
+    @property
+    def fingerprints(self):
+        # Folded only when asked for, most requests are never logged
+        fingerprints = Counter()
+        for sql, count in (self.statements or {}).items():
+            fingerprints[fingerprint(sql)] += count
+        return fingerprints
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count for sql, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+
+@contextmanager
+def record_queries(stats):
+    """Record queries of the connections of this thread into stats"""
+    with ExitStack() as stack:
+        if stats is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+class QueryStatsMiddleware:
+    """Record queries and database time of every request
+
+    Adds a Server-Timing header if settings.QUERY_STATS_SERVER_TIMING is
+    on and logs one JSON line per request to the "foodgram.queries"
+    logger. Requests over the budget of their view are logged as
+    warnings, or raise QueryBudgetExceeded if settings.QUERY_BUDGET_RAISE
+    is on. With a connection pool the record also has the time the
+    request waited for connections and the pool gauges. Queries run while
+    a streaming response is being sent are not counted. In async mode only
+    queries run by foodgram.db.database_sync_to_async are counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = QueryStats(
+            # SQL texts only serve the duplicates of records that get logged
+            statements=logger.isEnabledFor(logging.WARNING)
+        )
+        request.query_budget = None
+        start = time.perf_counter()
+        token = current_query_stats.set(stats)
+        try:
+            with record_queries(stats):
+                response = self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        return self.finish(
+            request, response, stats, time.perf_counter() - start
+        )
+
+    async def __acall__(self, request):
+        stats = QueryStats(
+            statements=logger.isEnabledFor(logging.WARNING)
+        )
+        request.query_budget = None
+        start = time.perf_counter()
+        token = current_query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_stats.reset(token)
+        return self.finish(
+            request, response, stats, time.perf_counter() - start
+        )
+
+    def finish(self, request, response, stats, duration):
+        budget = request.query_budget
+        over_budget = budget is not None and stats.count > budget
+        level = logging.WARNING if over_budget else logging.INFO
+        db_ms = round(stats.duration * 1000, 2)
+        total_ms = round(duration * 1000, 2)
+        pool_wait_ms = round(stats.pool_wait * 1000, 2)
+        # The record is only built for the levels the logger lets through
+        if logger.isEnabledFor(level):
+            record = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': db_ms,
+                'total_ms': total_ms,
+                'duplicates': stats.duplicates,
+                'budget': budget,
+            }
+            pools = pool_stats()
+            if pools:
+                record['pool_wait_ms'] = pool_wait_ms
+                record['pools'] = pools
+            logger.log(level, json.dumps(record))
+        if over_budget and settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(
+                f'{request.method} {request.path} ran {stats.count} '
+                f'queries, the budget is {budget}'
+            )
+        if settings.QUERY_STATS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms};desc="{stats.count} queries", '
+                + (f'pool;dur={pool_wait_ms}, ' if pool_stats() else '')
+                + f'total;dur={total_ms}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func, request.method)
@@ -0,0 +1,108 @@
+import json
+import re
+import secrets
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.compat import (
+    INDENT_SEPARATORS,
+    LONG_SEPARATORS,
+    SHORT_SEPARATORS
+)
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODERS = ('orjson', 'json') if orjson is not None else ('json',)
+
+
+class Fragment(bytes):
+    """Encoded JSON value, put into the output of the renderer as it is"""
+
+
+def get_encoder(name=None):
+    """The encoder from settings.JSON_ENCODER if it is installed"""
+    name = name or settings.JSON_ENCODER
+    return name if name in ENCODERS else 'json'
+
+
+def encode(data, encoder=None, indent=None, ensure_ascii=False,
+           compact=True, allow_nan=True):
+    """Encode data as rest_framework's JSONRenderer does, splicing fragments
+
+    Fragments are replaced by unique string placeholders while encoding,
+    the placeholders are then replaced by the fragments.
+    """
+    if isinstance(data, Fragment) and indent is None:
+        return bytes(data)
+    fragments = []
+    marker = secrets.token_hex(8)
+    fallback = JSONEncoder().default
+
+    def default(obj):
+        if isinstance(obj, Fragment):
+            fragments.append(obj)
+            return f'\0{marker}:{len(fragments) - 1}'
+        return fallback(obj)
+
+    content = None
+    if (get_encoder(encoder) == 'orjson' and indent is None
+            and not ensure_ascii and compact):
+        try:
+            content = orjson.dumps(data, default=default, option=(
+                orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            ))
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits and the like
+            fragments.clear()
+    if content is None:
+        content = json.dumps(
+            data, default=default, indent=indent, ensure_ascii=ensure_ascii,
+            allow_nan=allow_nan,
+            separators=(
+                INDENT_SEPARATORS if indent is not None
+                else SHORT_SEPARATORS if compact else LONG_SEPARATORS
+            )
+        ).encode()
+    if fragments:
+        content = re.sub(
+            rb'"\\u0000' + marker.encode() + rb':(\d+)"',
+            lambda match: fragments[int(match.group(1))],
+            content
+        )
+    # Same escaping of line separators as rest_framework's JSONRenderer
+    return content.replace(
+        b'\xe2\x80\xa8', b'\\u2028'
+    ).replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def fragment(data):
+    """Encode data once to put it into many responses"""
+    return Fragment(encode(data))
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSON renderer with a configurable encoder and fragments support
+
+    The output is the same as of rest_framework's JSONRenderer. orjson is
+    used for compact output when settings.JSON_ENCODER is "orjson" and it
+    is installed, the standard json module otherwise.
+    """
+    encoder = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return encode(
+            data,
+            encoder=self.encoder,
+            indent=self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ),
+            ensure_ascii=self.ensure_ascii,
+            compact=self.compact,
+            allow_nan=not self.strict
+        )
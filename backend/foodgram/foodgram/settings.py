@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,17 +67,72 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections are kept for CONN_MAX_AGE seconds and checked before reuse.
+# With DB_POOL_SIZE they are returned to a pool of the process after every
+# request instead (foodgram.backends).
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(
+            os.getenv('CONN_MAX_AGE', 0 if DB_POOL_SIZE else 60)
+        ),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'CONN_HEALTH_CHECKS', 'True'
+        ).lower() == 'true',
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        },
     }
 }
 
+# Shared by all workers: files by default, e.g. PyMemcacheCache with
+# CACHE_LOCATION=memcached:11211 for several hosts. MAX_ENTRIES and
+# CULL_FREQUENCY only apply to file and local memory caches: a third of
+# the entries is removed once there are more than MAX_ENTRIES.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+            'CULL_FREQUENCY': int(os.getenv('CACHE_CULL_FREQUENCY', 3)),
+        },
+    }
+}
+
+# Rendered shopping lists are kept until the cart changes or expire
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 60 * 60 * 24)
+)
+
+# Ingredient autocomplete: result cap and in-process cache of hot prefixes
+INGREDIENTS_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENTS_AUTOCOMPLETE_LIMIT', 50)
+)
+INGREDIENTS_AUTOCOMPLETE_CACHE_SIZE = 1024
+
+# How long browsers and nginx may reuse tag and ingredient lists
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+
+# Cached recipe representations are also replaced on every change
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Hit and miss counters of the recipe cache (see cache_stats), counted in
+# every process and added to the shared ones every few seconds
+CACHE_STATS = os.getenv('CACHE_STATS', 'False').lower() == 'true'
+CACHE_STATS_FLUSH_INTERVAL = int(os.getenv('CACHE_STATS_FLUSH_INTERVAL', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -122,6 +178,19 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Recipe pictures: maximum decoded size and dimensions (width * height),
+# resized variants (fit in box)
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+)
+RECIPE_IMAGE_VARIANTS = {
+    'image_thumbnail': (480, 480),
+    'image_detail': (1280, 1280),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -136,6 +205,51 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Encoder of JSON responses: "orjson" (used when installed) or "json"
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'orjson')
+
+# Paginated counts: cached per filter signature for a few seconds, and
+# estimated from PostgreSQL statistics for large unfiltered tables
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 10)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+
+# Query statistics of every request (foodgram.middleware): the header is
+# for development, raising on exceeded query budgets is for tests
+QUERY_STATS_SERVER_TIMING = os.getenv(
+    'QUERY_STATS_SERVER_TIMING', str(DEBUG)
+).lower() == 'true'
+QUERY_BUDGET_RAISE = os.getenv(
+    'QUERY_BUDGET_RAISE', 'False'
+).lower() == 'true'
+
+# Async views of the read routes (meals.async_views), for ASGI servers
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 FORBIDDEN_CHAR = r'^[\w.@+-]+$'
@@ -10,6 +10,17 @@ from .models import (
     Tag,
     TagRecipe
 )
+from .utils import delete_counted, invalidate_recipe_shopping_lists
+
+
+class CountedDeleteMixin:
+    """Deletes with delete_counted(), keeping the counters up to date"""
+
+    def delete_model(self, request, obj):
+        delete_counted(type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_counted(queryset)
 
 
 class IngredientRecipeInline(admin.StackedInline):
@@ -50,11 +61,12 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(CountedDeleteMixin, admin.ModelAdmin):
     list_display = (
         'author',
         'name',
-        'favorites_number'
+        'favorites_count',
+        'cart_count'
     )
     list_filter = ('author', 'name', 'tags')
     ordering = ['id']
@@ -62,13 +74,14 @@ class RecipeAdmin(admin.ModelAdmin):
         TagRecipeInline, IngredientRecipeInline
     )
 
-    @admin.display(description="In favorites")
-    def favorites_number(self, obj):
-        return obj.favorites.all().count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            invalidate_recipe_shopping_lists(form.instance.id)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(CountedDeleteMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'recipe',
@@ -76,7 +89,7 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(CountedDeleteMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'recipe',
@@ -5,3 +5,6 @@ class MealsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'meals'
     verbose_name = 'Food'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,59 @@
+from functools import wraps
+
+from django.conf import settings
+from django.urls import URLPattern
+
+from foodgram.db import database_sync_to_async
+
+# Read routes served by async views when settings.ASYNC_VIEWS is on
+ASYNC_ROUTES = (
+    'tags-list',
+    'ingredients-list',
+    'recipes-list',
+    'recipes-detail',
+    'download_shopping_cart',
+)
+
+
+def async_view(view):
+    """Async view running the view in a thread of the executor
+
+    The response is rendered and a streaming response is read in the same
+    thread, so the event loop only sends the ready content and a slow
+    client does not hold a thread. Django 3.2 iterates streaming content
+    synchronously inside the event loop, so a lazy generator running
+    queries cannot be passed on: the whole content is kept in memory.
+    """
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+
+    respond = database_sync_to_async(respond)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await respond(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_routes(patterns):
+    """URL patterns with ASYNC_ROUTES served by async views
+
+    The patterns are returned as they are if settings.ASYNC_VIEWS is off.
+    """
+    if not settings.ASYNC_VIEWS:
+        return patterns
+    return [
+        URLPattern(
+            pattern.pattern, async_view(pattern.callback),
+            pattern.default_args, pattern.name
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in ASYNC_ROUTES
+        else pattern
+        for pattern in patterns
+    ]
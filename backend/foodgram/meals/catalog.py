@@ -0,0 +1,41 @@
+import threading
+
+from foodgram.renderers import encode
+
+from .models import CatalogVersion, Product, Tag
+
+
+class Catalog:
+    """Process-local copy of tags and products
+
+    Both tables are loaded once and kept together with their JSON
+    representation. They are reloaded when CatalogVersion changes.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.Lock()
+
+    def load(self, version):
+        self.tags = list(Tag.objects.values('id', 'name', 'color', 'slug'))
+        self.products = list(
+            Product.objects.values('id', 'name', 'measurement_unit')
+        )
+        self.tag_ids = {tag['slug']: tag['id'] for tag in self.tags}
+        self.rendered = {
+            'tags': encode(self.tags),
+            'products': encode(self.products),
+        }
+        self.version = version
+
+    def refresh(self):
+        """Reload the catalog if it has changed, return its version"""
+        version = CatalogVersion.get_version()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.load(version)
+        return version
+
+
+catalog = Catalog()
@@ -1,14 +1,33 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
 from users.models import Subscription
 
-from .models import Product, Recipe, Tag
+from .catalog import catalog
+from .models import Product, Recipe, TagRecipe
+from .utils import search_products
+
+
+class TagSlugsField(django_filters.fields.MultipleChoiceField):
+    """Tag slugs, checked against the catalog only when some are given"""
+
+    def validate(self, value):
+        if value:
+            catalog.refresh()
+        super().validate(value)
+
+    def valid_value(self, value):
+        return value in catalog.tag_ids
+
+
+class TagSlugsFilter(filters.MultipleChoiceFilter):
+    field_class = TagSlugsField
 
 
 class ProductFilter(django_filters.FilterSet):
     """Product Filter"""
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Product
@@ -16,14 +35,13 @@ class ProductFilter(django_filters.FilterSet):
             'name',
         }
 
+    def filter_name(self, queryset, name, value):
+        return search_products(queryset, value)
+
 
 class RecipeFilter(django_filters.FilterSet):
     """Recipe filter"""
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    tags = TagSlugsFilter(method='filter_tags')
     is_favorited = filters.BooleanFilter(field_name='is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='is_in_shopping_cart'
@@ -33,6 +51,17 @@ class RecipeFilter(django_filters.FilterSet):
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        # A semi-join keeps one row per recipe without DISTINCT
+        tag_ids = [catalog.tag_ids.get(slug) for slug in value]
+        return queryset.filter(
+            Exists(
+                TagRecipe.objects.filter(
+                    recipe=OuterRef('pk'), tag_id__in=tag_ids
+                )
+            )
+        )
+
 
 class SubscriptionFilter(django_filters.FilterSet):
     """Subsctiption filter"""
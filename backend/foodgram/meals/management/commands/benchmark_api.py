@@ -0,0 +1,295 @@
+import base64
+import io
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from collections import namedtuple
+from itertools import count
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from foodgram.middleware import QueryStats, record_queries
+from meals.models import Product, Recipe, Tag
+from users.models import User
+
+Step = namedtuple(
+    'Step', ('name', 'method', 'path', 'data'), defaults=(None,)
+)
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of the values"""
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def png_data_url():
+    image = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 120, 40)).save(image, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        image.getvalue()
+    ).decode()
+
+
+def allowed_host():
+    """A host name the test client may use with settings.ALLOWED_HOSTS"""
+    return next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+         if host and host != '*'),
+        'localhost'
+    )
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenarios(user, password, recipe, author, tags, product):
+    """Requests of one iteration of every route in api/urls.py
+
+    Add and remove requests come in pairs, so every iteration leaves the
+    database as it found it.
+    """
+    new_users = count()
+
+    def new_user(state):
+        username = f'{user.username}_new_{next(new_users)}'
+        return {
+            'email': f'{username}@example.com',
+            'username': username,
+            'first_name': 'New',
+            'last_name': 'User',
+            'password': password,
+        }
+
+    recipe_url = f'/api/recipes/{recipe.id}'
+    tag_query = '&'.join(f'tags={slug}' for slug in tags)
+    recipe_data = {
+        'tags': list(Tag.objects.filter(slug__in=tags).values_list(
+            'id', flat=True
+        )),
+        'ingredients': [{'id': product.id, 'amount': 10}],
+        'name': 'Benchmark recipe',
+        'image': png_data_url(),
+        'text': 'Benchmark recipe',
+        'cooking_time': 10,
+    }
+    return (
+        (Step('users-list', 'GET', '/api/users/'),),
+        (Step('users-list-cursor', 'GET', '/api/users/?cursor=&limit=10'),),
+        (Step('users-retrieve', 'GET', f'/api/users/{author.id}/'),),
+        (Step('users-me', 'GET', '/api/users/me/'),),
+        (Step('users-create', 'POST', '/api/users/', new_user),),
+        (Step('users-set-password', 'POST', '/api/users/set_password/', {
+            'current_password': password, 'new_password': password
+        }),),
+        (Step('auth-token-login', 'POST', '/api/auth/token/login/', {
+            'email': user.email, 'password': password
+        }),),
+        (Step('subscriptions-list', 'GET',
+              '/api/users/subscriptions/?recipes_limit=3'),),
+        (Step('subscribe', 'POST', f'/api/users/{author.id}/subscribe/'),
+         Step('unsubscribe', 'DELETE',
+              f'/api/users/{author.id}/subscribe/')),
+        (Step('tags-list', 'GET', '/api/tags/'),),
+        (Step('tags-retrieve', 'GET',
+              f'/api/tags/{recipe_data["tags"][0]}/'),),
+        (Step('ingredients-list', 'GET', '/api/ingredients/'),),
+        (Step('ingredients-search', 'GET',
+              f'/api/ingredients/?name={product.name[:4]}'),),
+        (Step('ingredients-retrieve', 'GET',
+              f'/api/ingredients/{product.id}/'),),
+        (Step('recipes-list', 'GET', '/api/recipes/'),),
+        (Step('recipes-list-tags', 'GET', f'/api/recipes/?{tag_query}'),),
+        (Step('recipes-list-favorited', 'GET',
+              '/api/recipes/?is_favorited=1'),),
+        (Step('recipes-list-author', 'GET',
+              f'/api/recipes/?author={author.id}'),),
+        (Step('recipes-list-popular', 'GET',
+              '/api/recipes/?ordering=-favorites_count'),),
+        (Step('recipes-list-cursor', 'GET',
+              '/api/recipes/?cursor=&limit=6'),),
+        (Step('recipes-retrieve', 'GET', f'{recipe_url}/'),),
+        (Step('recipes-create', 'POST', '/api/recipes/', recipe_data),
+         Step('recipes-update', 'PATCH',
+              lambda state: f'/api/recipes/{state["id"]}/',
+              dict(recipe_data, name='Benchmark recipe, updated')),
+         Step('recipes-delete', 'DELETE',
+              lambda state: f'/api/recipes/{state["id"]}/')),
+        (Step('favorite-add', 'POST', f'{recipe_url}/favorite/'),
+         Step('favorite-remove', 'DELETE', f'{recipe_url}/favorite/')),
+        (Step('shopping-cart-add', 'POST', f'{recipe_url}/shopping_cart/'),
+         Step('shopping-cart-remove', 'DELETE',
+              f'{recipe_url}/shopping_cart/')),
+        (Step('shopping-cart-download', 'GET',
+              '/api/recipes/download_shopping_cart/'),),
+    )
+
+
+class Command(BaseCommand):
+    help = ('Measure latency and queries of every API route on the '
+            'current database (see seed_benchmark_data)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            default='bench_0',
+            help='User the requests are made as'
+        )
+        parser.add_argument('--password', default='benchmark-password')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--route',
+            action='append',
+            help='Only run routes whose name contains this text'
+        )
+        parser.add_argument('--output', help='Save the results as JSON')
+        parser.add_argument(
+            '--compare',
+            help='JSON results of an earlier run to compare with'
+        )
+
+    def get_client(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(
+            SERVER_NAME=allowed_host(), HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+
+    def request(self, client, step, state):
+        path = step.path(state) if callable(step.path) else step.path
+        data = step.data(state) if callable(step.data) else step.data
+        with record_queries(QueryStats()) as stats:
+            start = time.perf_counter()
+            response = client.generic(
+                step.method, path,
+                json.dumps(data) if data is not None else '',
+                content_type='application/json'
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{step.name}: {step.method} {path} answered '
+                f'{response.status_code} {response.content[:200]!r}'
+            )
+        if response.status_code == 201:
+            state['id'] = response.json().get('id')
+        return response.status_code, elapsed, stats.count
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(
+                f'No user {options["username"]}, run seed_benchmark_data'
+            )
+        recipe = Recipe.objects.exclude(favorites__user=user).exclude(
+            shopping_cart__user=user
+        ).order_by('-favorites_count', 'id').first()
+        author = User.objects.exclude(id=user.id).exclude(
+            to_user_subscriptions__user=user
+        ).order_by('-followers_count', 'id').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+        product = Product.objects.order_by('id').first()
+        if None in (recipe, author, product) or not tags:
+            raise CommandError('Not enough data, run seed_benchmark_data')
+
+        client = self.get_client(user)
+        timings = {}
+        try:
+            for steps in scenarios(
+                user, options['password'], recipe, author, tags, product
+            ):
+                if options['route'] and not any(
+                    route in step.name
+                    for step in steps for route in options['route']
+                ):
+                    continue
+                for iteration in range(options['warmup'] + options['repeat']):
+                    state = {}
+                    for step in steps:
+                        status, elapsed, queries = self.request(
+                            client, step, state
+                        )
+                        if iteration < options['warmup']:
+                            continue
+                        timing = timings.setdefault(step.name, {
+                            'method': step.method,
+                            'status': status,
+                            'latency': [],
+                            'queries': [],
+                        })
+                        timing['latency'].append(elapsed * 1000)
+                        timing['queries'].append(queries)
+        finally:
+            User.objects.filter(
+                username__startswith=f'{user.username}_new_'
+            ).delete()
+
+        results = {
+            name: {
+                'method': timing['method'],
+                'status': timing['status'],
+                'p50_ms': round(percentile(timing['latency'], 50), 3),
+                'p99_ms': round(percentile(timing['latency'], 99), 3),
+                'mean_ms': round(statistics.mean(timing['latency']), 3),
+                'queries': max(timing['queries']),
+                'queries_median': statistics.median(timing['queries']),
+            }
+            for name, timing in timings.items()
+        }
+        self.report(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {
+                        'revision': git_revision(),
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                        'python': platform.python_version(),
+                        'django': django.get_version(),
+                        'database': connections['default'].vendor,
+                        'repeat': options['repeat'],
+                        'recipes': Recipe.objects.count(),
+                        'users': User.objects.count(),
+                    },
+                    'results': results,
+                }, file, indent=2)
+            self.stdout.write(f'Results saved to {options["output"]}')
+
+    def report(self, results, compare):
+        previous = {}
+        if compare:
+            with open(compare, encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        self.stdout.write(
+            f'{"route":<26}{"method":<8}{"p50 ms":>10}{"p99 ms":>10}'
+            f'{"queries":>9}' + ('   p50 vs previous' if previous else '')
+        )
+        for name, result in results.items():
+            line = (
+                f'{name:<26}{result["method"]:<8}{result["p50_ms"]:>10.2f}'
+                f'{result["p99_ms"]:>10.2f}{result["queries"]:>9}'
+            )
+            if name in previous:
+                change = result['p50_ms'] / previous[name]['p50_ms'] - 1
+                line += (
+                    f'{change:>+12.0%} '
+                    f'({previous[name]["queries"]} queries)'
+                )
+            self.stdout.write(line)
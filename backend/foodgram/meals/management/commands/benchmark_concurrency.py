@@ -0,0 +1,153 @@
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from meals.models import Product
+from users.models import User
+
+from .benchmark_api import percentile
+
+READ_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name={product}',
+    '/api/recipes/?limit=100',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+class Command(BaseCommand):
+    help = ('Measure throughput of concurrent clients on running servers, '
+            'e.g. sync gunicorn workers and uvicorn workers with '
+            'ASYNC_VIEWS on')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls',
+            nargs='+',
+            help='Base URLs of the servers, e.g. http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            action='append',
+            help='Concurrent clients, 1, 10 and 50 by default'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Seconds of every run'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Paths requested in turn, the read routes by default'
+        )
+        parser.add_argument(
+            '--username',
+            default='bench_0',
+            help='User the requests are made as'
+        )
+        parser.add_argument(
+            '--read-delay',
+            type=float,
+            default=0,
+            help='Seconds a client waits before reading every response, '
+                 'to imitate slow clients'
+        )
+
+    def client(self, url, paths, headers, deadline, read_delay):
+        """Requests of one client until the deadline"""
+        address = urlsplit(url)
+        connection_class = (
+            http.client.HTTPSConnection if address.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        connection = connection_class(address.netloc, timeout=60)
+        latencies, errors = [], 0
+        try:
+            for path in cycle(paths):
+                if time.perf_counter() >= deadline:
+                    break
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    if read_delay:
+                        time.sleep(read_delay)
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    errors += 1
+                    continue
+                if response.status >= 400:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection.close()
+        return latencies, errors
+
+    def run(self, url, clients, paths, headers, options):
+        barrier = threading.Barrier(clients)
+
+        def client(number):
+            barrier.wait()
+            # Clients start at different paths
+            offset = number % len(paths)
+            return self.client(
+                url, paths[offset:] + paths[:offset], headers,
+                time.perf_counter() + options['duration'],
+                options['read_delay']
+            )
+
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(client, range(clients)))
+        latencies = [
+            latency for client_latencies, _ in results
+            for latency in client_latencies
+        ]
+        errors = sum(client_errors for _, client_errors in results)
+        return latencies, errors
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(
+                f'No user {options["username"]}, run seed_benchmark_data'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        product = Product.objects.order_by('id').values_list(
+            'name', flat=True
+        ).first() or ''
+        paths = [
+            path.format(product=quote(product[:3]))
+            for path in options['path'] or READ_PATHS
+        ]
+        self.stdout.write(
+            f'{"server":<28}{"clients":>8}{"req/s":>10}{"p50 ms":>10}'
+            f'{"p99 ms":>10}{"errors":>8}'
+        )
+        for url in options['urls']:
+            url = url.rstrip('/')
+            for clients in options['clients'] or (1, 10, 50):
+                latencies, errors = self.run(
+                    url, clients, paths, headers, options
+                )
+                if not latencies:
+                    raise CommandError(f'{url}: no successful requests')
+                self.stdout.write(
+                    f'{url:<28}{clients:>8}'
+                    f'{len(latencies) / options["duration"]:>10.1f}'
+                    f'{statistics.median(latencies):>10.2f}'
+                    f'{percentile(latencies, 99):>10.2f}{errors:>8}'
+                )
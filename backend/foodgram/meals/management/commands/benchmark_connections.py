@@ -0,0 +1,75 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from foodgram.backends.pool import pool_stats
+
+from .benchmark_api import percentile
+
+
+class Command(BaseCommand):
+    help = ('Measure the connection handling of the database settings: '
+            'simulated requests in threads, each with one query')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--query', default='SELECT 1')
+
+    def request(self, query):
+        """One request as the handlers run it: signals around a query"""
+        start = time.perf_counter()
+        request_started.send(sender=self.__class__)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+        finally:
+            request_finished.send(sender=self.__class__)
+        return (time.perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        connects = []
+        lock = threading.Lock()
+
+        def count_connect(sender, connection, **kwargs):
+            with lock:
+                connects.append(connection.alias)
+
+        connection_created.connect(count_connect)
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'{connection.vendor}: CONN_MAX_AGE='
+            f'{settings_dict["CONN_MAX_AGE"]}, CONN_HEALTH_CHECKS='
+            f'{settings_dict.get("CONN_HEALTH_CHECKS", False)}, pool size '
+            f'{(settings_dict.get("POOL") or {}).get("MAX_SIZE") or 0}'
+        )
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                latencies = list(pool.map(
+                    lambda _: self.request(options['query']),
+                    range(options['requests'])
+                ))
+        finally:
+            connection_created.disconnect(count_connect)
+            connections.close_all()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{len(latencies) / elapsed:.1f} requests/s, '
+            f'p50 {statistics.median(latencies):.2f} ms, '
+            f'p99 {percentile(latencies, 99):.2f} ms, '
+            f'{len(connects)} connects'
+        )
+        for alias, stats in pool_stats().items():
+            self.stdout.write(
+                f'pool {alias}: ' + ', '.join(
+                    f'{name} {value}' for name, value in stats.items()
+                )
+            )
@@ -0,0 +1,126 @@
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from foodgram.middleware import QueryStats
+from meals.representations import RECIPE_VALUES, recipe_representations
+from meals.serializers import RecipeSerializer
+from meals.views import RecipeViewSet
+from users.models import User
+
+from .benchmark_api import allowed_host, percentile
+
+
+class Command(BaseCommand):
+    help = ('Check that recipe lists built from plain rows give the same '
+            'JSON as RecipeSerializer and compare the time of both')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            action='append',
+            help='Recipes per page, 6, 20 and 100 by default'
+        )
+        parser.add_argument(
+            '--username',
+            help='User the lists are built for, anonymous by default'
+        )
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def get_view(self, user, page_size):
+        request = APIRequestFactory().get(
+            '/api/recipes/', {'limit': page_size}, SERVER_NAME=allowed_host()
+        )
+        force_authenticate(request, user)
+        view = RecipeViewSet(
+            action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={}
+        )
+        view.request = view.initialize_request(request)
+        return view
+
+    def rows(self, view, page_size):
+        queryset = view.filter_queryset(view.get_queryset())
+        return list(queryset.values(*RECIPE_VALUES)[:page_size])
+
+    def fast(self, view, page_size):
+        return JSONRenderer().render(recipe_representations(
+            self.rows(view, page_size),
+            view.get_serializer_context(),
+            'image_thumbnail'
+        ))
+
+    def serializer(self, view, page_size):
+        queryset = view.filter_queryset(view.get_queryset()).prefetch_related(
+            'tags', 'ingredients__product'
+        )
+        return JSONRenderer().render(RecipeSerializer(
+            queryset[:page_size],
+            many=True,
+            context=view.get_serializer_context()
+        ).data)
+
+    def check_contract(self, view, page_size):
+        """The list view answers what RecipeSerializer gives for its page"""
+        response = view.list(view.request)
+        expected = self.serializer(view, page_size)
+        if JSONRenderer().render(response.data['results']) != expected:
+            raise CommandError(
+                f'Recipe list of {page_size} differs from RecipeSerializer'
+            )
+        if self.fast(view, page_size) != expected:
+            raise CommandError(
+                f'recipe_representations of {page_size} recipes differ '
+                'from RecipeSerializer'
+            )
+
+    def measure(self, build, view, page_size, repeat):
+        timings = []
+        stats = QueryStats()
+        for _ in range(repeat):
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                start = time.perf_counter()
+                build(view, page_size)
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings, stats.count // repeat
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f'No user {options["username"]}')
+        repeat = options['repeat']
+        self.stdout.write(
+            f'{"page":>6}{"serializer p50/p99 ms":>24}'
+            f'{"rows p50/p99 ms":>20}{"speedup":>9}{"queries":>10}'
+        )
+        for page_size in options['page_size'] or (6, 20, 100):
+            view = self.get_view(user, page_size)
+            self.check_contract(view, page_size)
+            slow, slow_queries = self.measure(
+                self.serializer, view, page_size, repeat
+            )
+            fast, fast_queries = self.measure(
+                self.fast, view, page_size, repeat
+            )
+            slow_p50 = statistics.median(slow)
+            fast_p50 = statistics.median(fast)
+            self.stdout.write(
+                f'{page_size:>6}'
+                f'{slow_p50:>15.2f} /{percentile(slow, 99):>7.2f}'
+                f'{fast_p50:>11.2f} /{percentile(fast, 99):>7.2f}'
+                f'{slow_p50 / fast_p50:>8.1f}x'
+                f'{slow_queries:>6} / {fast_queries}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'The JSON of both paths is the same'
+        ))
@@ -0,0 +1,103 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.renderers import ENCODERS, FastJSONRenderer, Fragment
+from meals.catalog import catalog
+from meals.utils import autocomplete_products
+
+from .benchmark_api import allowed_host, percentile
+
+
+def plain(data):
+    """Data with fragments decoded, for rest_framework's JSONRenderer"""
+    if isinstance(data, Fragment):
+        return json.loads(data)
+    if isinstance(data, dict):
+        return {key: plain(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [plain(value) for value in data]
+    return data
+
+
+class Command(BaseCommand):
+    help = ('Compare the time of JSON renderers on recipe and ingredient '
+            'lists and check that their output is the same')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument(
+            '--name',
+            help=('Search text of the ingredient autocomplete, the start of '
+                  'the first product name by default')
+        )
+
+    def datasets(self, name):
+        response = Client(SERVER_NAME=allowed_host()).get(
+            '/api/recipes/', {'limit': 100}
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f'/api/recipes/ answered {response.status_code}'
+            )
+        catalog.refresh()
+        if not catalog.products:
+            raise CommandError('No products, run seed_benchmark_data')
+        name = name or catalog.products[0]['name'][:3]
+        return {
+            '/api/recipes/?limit=100': response.data,
+            '/api/ingredients/': catalog.products,
+            f'/api/ingredients/?name={name}': autocomplete_products(name),
+        }
+
+    def renderers(self):
+        renderers = {'rest_framework': JSONRenderer()}
+        for encoder in ENCODERS:
+            renderers[encoder] = FastJSONRenderer()
+            renderers[encoder].encoder = encoder
+        return renderers
+
+    def measure(self, renderer, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            renderer.render(data)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        renderers = self.renderers()
+        self.stdout.write(
+            f'{"data":<32}{"renderer":<16}{"bytes":>9}'
+            f'{"p50 ms":>10}{"p99 ms":>10}{"speedup":>9}'
+        )
+        for path, data in self.datasets(options['name']).items():
+            baseline = None
+            for name, renderer in renderers.items():
+                renderer_data = (
+                    plain(data) if name == 'rest_framework' else data
+                )
+                content = renderer.render(renderer_data)
+                timings = self.measure(
+                    renderer, renderer_data, options['repeat']
+                )
+                median = statistics.median(timings)
+                if baseline is None:
+                    baseline, expected = median, content
+                elif content != expected:
+                    raise CommandError(
+                        f'{name} output of {path} differs from '
+                        'rest_framework JSONRenderer'
+                    )
+                self.stdout.write(
+                    f'{path:<32}{name:<16}{len(content):>9}{median:>10.3f}'
+                    f'{percentile(timings, 99):>10.3f}'
+                    f'{baseline / median:>8.1f}x'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            'The output of all renderers is the same'
+        ))
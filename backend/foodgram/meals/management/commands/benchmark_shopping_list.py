@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from meals.renderers import SHOPPING_LIST_RENDERERS
+
+
+class Command(BaseCommand):
+    help = 'Compare shopping list renderers throughput on a synthetic cart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        recipes = [
+            (f'Recipe {recipe_num}', [
+                (f'Product {ingredient_num}', 12.5, 'g')
+                for ingredient_num in range(options['ingredients'])
+            ])
+            for recipe_num in range(options['recipes'])
+        ]
+        totals = [
+            (f'Product {ingredient_num}', 12.5 * options['recipes'], 'g')
+            for ingredient_num in range(options['ingredients'])
+        ]
+        for renderer_class in SHOPPING_LIST_RENDERERS:
+            renderer = renderer_class()
+            size = 0
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                for chunk in renderer.stream(iter(recipes), iter(totals)):
+                    size += len(chunk)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{renderer.format}: '
+                f'{options["repeat"] / elapsed:.1f} lists/sec, '
+                f'{size / elapsed / 2 ** 20:.1f} MB/sec'
+            )
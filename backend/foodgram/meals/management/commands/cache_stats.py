@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+CACHES = ('recipe',)
+
+
+class Command(BaseCommand):
+    help = ('Show hit and miss counters of the application caches, '
+            'counted with CACHE_STATS on')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Set the counters to zero after showing them'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_STATS:
+            self.stdout.write('CACHE_STATS is off, the counters do not change')
+        for name in CACHES:
+            keys = (f'cache_stats:{name}:hits', f'cache_stats:{name}:misses')
+            hits, misses = (cache.get(key, 0) for key in keys)
+            total = hits + misses
+            self.stdout.write(
+                f'{name}: {hits} hits, {misses} misses'
+                + (f', {hits / total:.1%} hit ratio' if total else '')
+            )
+            if options['reset']:
+                cache.delete_many(keys)
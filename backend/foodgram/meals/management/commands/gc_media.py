@@ -0,0 +1,100 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from meals.models import Recipe
+from meals.storage import recipe_image_storage
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_detail')
+
+
+def stored_files(storage, directory):
+    """Names of all files under the directory of the storage"""
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield os.path.join(directory, file_name)
+    for subdirectory in directories:
+        yield from stored_files(storage, os.path.join(directory, subdirectory))
+
+
+def referenced_names(names):
+    """Names of the files any recipe refers to"""
+    condition = models.Q()
+    for field in IMAGE_FIELDS:
+        condition |= models.Q(**{f'{field}__in': names})
+    referenced = set()
+    for row in Recipe.objects.filter(condition).values_list(*IMAGE_FIELDS):
+        referenced.update(row)
+    return referenced
+
+
+def is_recent(storage, name, deadline):
+    """Whether the file was changed after the deadline or is gone"""
+    try:
+        return os.path.getmtime(storage.path(name)) > deadline
+    except FileNotFoundError:
+        return True
+
+
+class Command(BaseCommand):
+    help = 'Remove recipe pictures that no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Keep files younger than this many seconds: they may '
+                 'belong to a recipe that is being saved right now'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be removed'
+        )
+
+    def handle(self, *args, **options):
+        storage = recipe_image_storage
+        directory = Recipe._meta.get_field('image').upload_to
+        if not storage.exists(directory):
+            self.stdout.write('Nothing to collect')
+            return
+        deadline = time.time() - options['min_age']
+        num_of_files = 0
+        num_of_removed = 0
+        removed_size = 0
+        files = stored_files(storage, directory)
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            num_of_files += len(batch)
+            referenced = referenced_names(batch)
+            candidates = [
+                name for name in batch
+                if name not in referenced and not is_recent(
+                    storage, name, deadline
+                )
+            ]
+            if candidates:
+                # A recipe may have been saved with one of them meanwhile
+                referenced = referenced_names(candidates)
+            for name in candidates:
+                if name in referenced or is_recent(storage, name, deadline):
+                    continue
+                try:
+                    removed_size += os.path.getsize(storage.path(name))
+                except FileNotFoundError:
+                    continue
+                num_of_removed += 1
+                if not options['dry_run']:
+                    storage.delete(name)
+        self.stdout.write(
+            f'{num_of_removed} of {num_of_files} files '
+            f'{"would be " * options["dry_run"]}removed, '
+            f'{removed_size / 2 ** 20:.1f} MB freed'
+        )
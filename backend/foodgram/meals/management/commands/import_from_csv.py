@@ -1,31 +1,210 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from meals.models import Product
+from meals.models import CatalogVersion, Product, Recipe, Tag, TagRecipe
+from meals.utils import create_ingredients
+
+User = get_user_model()
+
+
+class Importer:
+    """Base importer: builds new objects and saves them in batches"""
+    model = None
+    fields = ()
+    key_fields = ()
+
+    def get_key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def existing_keys(self):
+        return set(self.model.objects.values_list(*self.key_fields))
+
+    def build(self, row):
+        return self.model(**{field: row[field] for field in self.fields})
+
+    def save(self, objects, batch_size):
+        self.model.objects.bulk_create(
+            objects, batch_size=batch_size, ignore_conflicts=True
+        )
+
+
+class CatalogImporter(Importer):
+    """Importer of tags and products: bulk_create sends no signals"""
+
+    def save(self, objects, batch_size):
+        super().save(objects, batch_size)
+        CatalogVersion.bump()
+
+
+class ProductImporter(CatalogImporter):
+    model = Product
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
+
+
+class TagImporter(CatalogImporter):
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    key_fields = ('slug',)
+
+
+class UserImporter(Importer):
+    model = User
+    fields = ('email', 'username', 'first_name', 'last_name', 'password')
+    key_fields = ('email',)
+
+    def build(self, row):
+        user = super().build(row)
+        user.password = make_password(row['password'])
+        return user
+
+
+class RecipeImporter(Importer):
+    """Recipes from JSON: author e-mail, tag slugs and ingredients"""
+    model = Recipe
+    fields = ('name', 'text', 'cooking_time', 'image')
+    key_fields = ('author__email', 'name')
+
+    def __init__(self):
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.products = {
+            (product.name, product.measurement_unit): product
+            for product in Product.objects.all()
+        }
+
+    def get_key(self, row):
+        return row['author'], row['name']
+
+    def build(self, row):
+        recipe = super().build(row)
+        try:
+            recipe.author_id = self.authors[row['author']]
+            recipe.tag_ids = [self.tags[slug] for slug in row['tags']]
+            recipe.ingredients_list = [
+                {
+                    'id': self.products[
+                        ingredient['name'], ingredient['measurement_unit']
+                    ],
+                    'amount': ingredient['amount']
+                }
+                for ingredient in row['ingredients']
+            ]
+        except KeyError as error:
+            raise CommandError(
+                f'Recipe "{row["name"]}": unknown {error.args[0]}'
+            )
+        return recipe
+
+    def save(self, objects, batch_size):
+        # Primary keys are needed for the relations, so no bulk_create here
+        tags_list = []
+        with transaction.atomic():
+            for recipe in objects:
+                recipe.save()
+                create_ingredients(recipe.ingredients_list, recipe)
+                tags_list.extend(
+                    TagRecipe(tag_id=tag_id, recipe=recipe)
+                    for tag_id in recipe.tag_ids
+                )
+            TagRecipe.objects.bulk_create(tags_list, batch_size=batch_size)
+
+
+IMPORTERS = {
+    'products': ProductImporter,
+    'tags': TagImporter,
+    'users': UserImporter,
+    'recipes': RecipeImporter,
+}
+
+
+def read_rows(file_name, fields):
+    """Rows of a CSV (with or without a header) or a JSON file"""
+    with open(file_name, encoding='utf-8') as file:
+        if Path(file_name).suffix == '.json':
+            yield from json.load(file)
+            return
+        reader = csv.reader(file, delimiter=',', quotechar='"')
+        header = next(reader, None)
+        if header is None:
+            return
+        if not set(fields) <= set(header):
+            # No header: columns go in the order of the importer fields
+            yield dict(zip(fields, header))
+            header = fields
+        for row in reader:
+            yield dict(zip(header, row))
 
 
 class Command(BaseCommand):
+    help = 'Bulk import of products, tags, users or recipes'
+
     def add_arguments(self, parser):
         parser.add_argument("csv_file", nargs="+", type=str)
+        parser.add_argument(
+            '--model',
+            choices=IMPORTERS,
+            help='What to import, by default guessed from the file name'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Read and deduplicate rows without saving them'
+        )
+
+    def get_model(self, csv_file_name, model):
+        if model:
+            return model
+        for name in IMPORTERS:
+            if name in Path(csv_file_name).stem:
+                return name
+        if 'ingredients' in Path(csv_file_name).stem:
+            return 'products'
+        raise CommandError(
+            f'Cannot guess what {csv_file_name} contains, use --model'
+        )
 
     def handle(self, *args, **options):
+        batch_size = options['batch_size']
         for csv_file_name in options["csv_file"]:
-            reader = csv.DictReader(
-                open(csv_file_name, encoding="utf-8"),
-                delimiter=",",
-                quotechar='"'
-            )
+            importer = IMPORTERS[
+                self.get_model(csv_file_name, options['model'])
+            ]()
+            start = time.perf_counter()
+            seen = importer.existing_keys()
+            num_of_rows = 0
             num_of_records = 0
-            for row in reader:
-                if "ingredients.csv" in csv_file_name:
-                    _product, created = Product.objects.get_or_create(
-                        name=row["name"],
-                        measurement_unit=row["measurement_unit"]
-                    )
-                    if created:
-                        num_of_records += 1
-
+            rows = read_rows(csv_file_name, importer.fields)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                num_of_rows += len(batch)
+                objects = []
+                for row in batch:
+                    key = importer.get_key(row)
+                    if key not in seen:
+                        seen.add(key)
+                        objects.append(importer.build(row))
+                if objects and not options['dry_run']:
+                    importer.save(objects, batch_size)
+                num_of_records += len(objects)
+                self.stdout.write(
+                    f'{num_of_rows} rows read, {num_of_records} new records'
+                )
+            elapsed = time.perf_counter() - start
             self.stdout.write(
-                f"Import complited, {num_of_records} records imported"
+                f'Import completed{" (dry run)" * options["dry_run"]}, '
+                f'{num_of_records} records imported from {num_of_rows} rows '
+                f'in {elapsed:.2f}s ({num_of_rows / (elapsed or 1):.0f} '
+                'rows/sec)'
             )
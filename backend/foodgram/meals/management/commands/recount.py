@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from meals.utils import COUNTERS
+
+
+def actual_count(related_model, related_field):
+    """Subquery counting the related rows of the outer row"""
+    return Coalesce(
+        models.Subquery(
+            related_model.objects.filter(
+                **{related_field: models.OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                count=models.Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Repair the counters of recipes and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many counters are wrong'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            wrong = model.objects.annotate(
+                actual=actual_count(related_model, related_field)
+            ).exclude(**{field: models.F('actual')})
+            if options['dry_run']:
+                repaired = wrong.count()
+            else:
+                repaired = model.objects.filter(
+                    pk__in=wrong.values('pk')
+                ).update(**{field: actual_count(related_model, related_field)})
+            self.stdout.write(
+                f'{model._meta.label}.{field}: {repaired} '
+                + ('wrong' if options['dry_run'] else 'repaired')
+            )
+        self.stdout.write(self.style.SUCCESS('Recount completed'))
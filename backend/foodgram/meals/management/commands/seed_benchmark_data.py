@@ -0,0 +1,207 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.models import (
+    CatalogVersion,
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Product,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagRecipe
+)
+from users.models import Subscription, User
+
+UNITS = ('g', 'ml', 'pcs', 'tbsp', 'tsp')
+AMOUNTS = (1, 2, 5, 10, 25, 50, 100, 150, 200, 250, 500, 1000)
+
+
+def zipf_weights(size, exponent):
+    """Cumulative weights where the n-th item is picked ~1/n^exponent"""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def bulk_insert(model, objects, batch_size):
+    """Insert objects in batches, rows that already exist are skipped"""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Zipf exponent of authors, recipe and tag popularity'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Prefix of the generated usernames, tags and products'
+        )
+        parser.add_argument(
+            '--password',
+            default='benchmark-password',
+            help='Password of all generated users'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def ids(self, queryset):
+        return list(queryset.order_by('id').values_list('id', flat=True))
+
+    def pairs(self, count, users, targets, weights, self_allowed=True):
+        """Distinct (user, target) pairs with popular targets picked more"""
+        pairs = set()
+        for _ in range(count * 3):
+            if len(pairs) == count:
+                break
+            user = self.random.choice(users)
+            target = self.random.choices(targets, cum_weights=weights)[0]
+            if self_allowed or user != target:
+                pairs.add((user, target))
+        return sorted(pairs)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+        skew = options['skew']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Users "{prefix}_*" already exist, use an empty database '
+                'or another --prefix'
+            )
+        self.random = random.Random(options['seed'])
+        start = time.perf_counter()
+
+        password = make_password(options['password'])
+        bulk_insert(User, (
+            User(
+                username=f'{prefix}_{num}',
+                email=f'{prefix}_{num}@example.com',
+                first_name=f'First {num}',
+                last_name=f'Last {num}',
+                password=password,
+            )
+            for num in range(options['users'])
+        ), batch_size)
+        users = self.ids(
+            User.objects.filter(username__startswith=f'{prefix}_')
+        )
+
+        bulk_insert(Tag, (
+            Tag(
+                name=f'{prefix} tag {num}',
+                color=f'#{self.random.randrange(0x1000000):06X}',
+                slug=f'{prefix}-{num}',
+            )
+            for num in range(options['tags'])
+        ), batch_size)
+        tags = self.ids(Tag.objects.filter(slug__startswith=f'{prefix}-'))
+
+        bulk_insert(Product, (
+            Product(
+                name=f'{prefix} product {num:05d}',
+                measurement_unit=self.random.choice(UNITS),
+            )
+            for num in range(options['products'])
+        ), batch_size)
+        products = self.ids(
+            Product.objects.filter(name__startswith=f'{prefix} product ')
+        )
+        bulk_insert(Ingredient, (
+            Ingredient(product_id=product_id, amount=amount)
+            for product_id in products
+            for amount in self.random.sample(AMOUNTS, 3)
+        ), batch_size)
+        ingredients = self.ids(Ingredient.objects.filter(
+            product__name__startswith=f'{prefix} product '
+        ))
+        CatalogVersion.bump()
+
+        author_weights = zipf_weights(len(users), skew)
+        bulk_insert(Recipe, (
+            Recipe(
+                author_id=self.random.choices(
+                    users, cum_weights=author_weights
+                )[0],
+                name=f'{prefix} recipe {num}',
+                text=f'Description of {prefix} recipe {num}. ' * 5,
+                cooking_time=self.random.randint(5, 180),
+                image='recipes/images/benchmark.png',
+            )
+            for num in range(options['recipes'])
+        ), batch_size)
+        recipes = self.ids(Recipe.objects.filter(author_id__in=users))
+
+        tag_weights = zipf_weights(len(tags), skew)
+        tags_per_recipe = min(options['tags_per_recipe'], len(tags))
+        bulk_insert(TagRecipe, (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipes
+            for tag_id in set(self.random.choices(
+                tags, cum_weights=tag_weights, k=tags_per_recipe
+            ))
+        ), batch_size)
+        ingredients_per_recipe = min(
+            options['ingredients_per_recipe'], len(ingredients)
+        )
+        bulk_insert(IngredientRecipe, (
+            IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id)
+            for recipe_id in recipes
+            for ingredient_id in self.random.sample(
+                ingredients, ingredients_per_recipe
+            )
+        ), batch_size)
+
+        # Popular recipes are the oldest ones, popular authors the first
+        recipe_weights = zipf_weights(len(recipes), skew)
+        for model, option in ((Favorite, 'favorites'),
+                              (ShoppingCart, 'carts')):
+            bulk_insert(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in self.pairs(
+                    options[option], users, recipes, recipe_weights
+                )
+            ), batch_size)
+        bulk_insert(Subscription, (
+            Subscription(user_id=user_id, subscription_to_user_id=author_id)
+            for user_id, author_id in self.pairs(
+                options['subscriptions'], users, users, author_weights,
+                self_allowed=False
+            )
+        ), batch_size)
+
+        # bulk_create sends no signals, so the counters are filled here
+        call_command('recount', stdout=self.stdout)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmark data created in {elapsed:.1f}s: {len(users)} users, '
+            f'{len(recipes)} recipes, {len(products)} products, '
+            f'{len(tags)} tags'
+        ))
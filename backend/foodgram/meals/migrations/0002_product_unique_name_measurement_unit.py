@@ -0,0 +1,43 @@
+# Generated by Django 3.2 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+def merge_duplicate_products(apps, schema_editor):
+    """Point ingredients to one product per (name, measurement_unit)"""
+    Product = apps.get_model('meals', 'Product')
+    Ingredient = apps.get_model('meals', 'Ingredient')
+    duplicates = Product.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        extra = Product.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=duplicate['keep_id'])
+        Ingredient.objects.filter(product__in=extra).update(
+            product_id=duplicate['keep_id']
+        )
+        extra.delete()
+    # Deferred foreign key checks must not be pending when the table is
+    # altered below
+    schema_editor.connection.check_constraints()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_products, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_product_name_measurement_unit'),
+        ),
+    ]
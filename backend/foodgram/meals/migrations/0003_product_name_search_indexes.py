@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Indexes for "UPPER(name::text) LIKE ..." generated by istartswith and
+# icontains: a pattern index for prefixes and a trigram index for
+# substrings. Other databases search products without them.
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS meals_product_name_prefix '
+    'ON meals_product (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS meals_product_name_trgm '
+    'ON meals_product USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS meals_product_name_prefix',
+    'DROP INDEX IF EXISTS meals_product_name_trgm',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0002_product_unique_name_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
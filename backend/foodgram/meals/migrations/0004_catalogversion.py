@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-17 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0003_product_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Version of the catalog of tags and products', verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Catalog version',
+                'verbose_name_plural': 'Catalog versions',
+            },
+        ),
+    ]
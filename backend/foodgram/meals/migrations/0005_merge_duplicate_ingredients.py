@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-17 06:24
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Point recipes to one ingredient per (product, amount) pair"""
+    Ingredient = apps.get_model('meals', 'Ingredient')
+    IngredientRecipe = apps.get_model('meals', 'IngredientRecipe')
+    duplicates = Ingredient.objects.order_by().values(
+        'product', 'amount'
+    ).annotate(
+        keep_id=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            product=duplicate['product'], amount=duplicate['amount']
+        ).exclude(id=duplicate['keep_id'])
+        IngredientRecipe.objects.filter(ingredient__in=extra).update(
+            ingredient_id=duplicate['keep_id']
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0004_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-17 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0005_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('product', 'amount'), name='unique_ingredient_product_amount'),
+        ),
+    ]
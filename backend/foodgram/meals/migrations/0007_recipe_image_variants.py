@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-17 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0006_ingredient_unique_product_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(blank=True, help_text='Picture resized for the recipe page', max_length=255, upload_to='recipes/images/', verbose_name='Detail picture'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, help_text='Small picture for recipe lists', max_length=255, upload_to='recipes/images/', verbose_name='Thumbnail'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Link to picture', max_length=255, upload_to='recipes/images/', verbose_name='Picture'),
+        ),
+    ]
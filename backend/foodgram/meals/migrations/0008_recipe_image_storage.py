@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-17 06:28
+
+from django.db import migrations, models
+import meals.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Link to picture', max_length=255, storage=meals.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Picture'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(blank=True, help_text='Picture resized for the recipe page', max_length=255, storage=meals.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Detail picture'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, help_text='Small picture for recipe lists', max_length=255, storage=meals.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Thumbnail'),
+        ),
+    ]
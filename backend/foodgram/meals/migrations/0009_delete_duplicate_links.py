@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-17 06:31
+
+from django.db import migrations, models
+
+LINKS = (
+    ('IngredientRecipe', ('recipe', 'ingredient')),
+    ('TagRecipe', ('recipe', 'tag')),
+    ('Favorite', ('user', 'recipe')),
+    ('ShoppingCart', ('user', 'recipe')),
+)
+
+
+def delete_duplicate_links(apps, schema_editor):
+    """Keep the oldest row of every duplicated link"""
+    for model_name, fields in LINKS:
+        model = apps.get_model('meals', model_name)
+        duplicates = model.objects.order_by().values(*fields).annotate(
+            keep_id=models.Min('id'), count=models.Count('id')
+        ).filter(count__gt=1)
+        for duplicate in duplicates:
+            model.objects.filter(
+                **{field: duplicate[field] for field in fields}
+            ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0008_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_links, migrations.RunPython.noop
+        ),
+    ]
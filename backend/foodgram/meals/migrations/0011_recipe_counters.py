@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-17 06:34
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('favorites_count', 'Favorite'),
+    ('cart_count', 'ShoppingCart'),
+)
+
+
+def count_recipe_links(apps, schema_editor):
+    Recipe = apps.get_model('meals', 'Recipe')
+    for field, model_name in COUNTERS:
+        model = apps.get_model('meals', model_name)
+        Recipe.objects.update(**{field: Coalesce(models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk')).order_by()
+            .values('recipe').annotate(count=models.Count('pk'))
+            .values('count')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0010_link_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users who added the recipe to shopping cart', verbose_name='In shopping carts'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Number of users who added the recipe to favorites', verbose_name='In favorites'),
+        ),
+        migrations.RunPython(count_recipe_links, migrations.RunPython.noop),
+    ]
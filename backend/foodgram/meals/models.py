@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from .storage import recipe_image_storage
+
 User = get_user_model()
 
 
@@ -34,6 +36,35 @@ class Tag(models.Model):
         return self.name
 
 
+class CatalogVersion(models.Model):
+    """Version of tags and products, changes on every save or delete"""
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Version',
+        help_text='Version of the catalog of tags and products'
+    )
+
+    class Meta:
+        verbose_name = 'Catalog version'
+        verbose_name_plural = 'Catalog versions'
+
+    def __str__(self):
+        return str(self.version)
+
+    @classmethod
+    def get_version(cls):
+        return cls.objects.filter(pk=1).values_list(
+            'version', flat=True
+        ).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(
+            version=models.F('version') + 1
+        ):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
 class Product(models.Model):
     """Product model"""
     name = models.CharField(
@@ -51,6 +82,12 @@ class Product(models.Model):
         ordering = ('id',)
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_product_name_measurement_unit'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -81,6 +118,12 @@ class Ingredient(models.Model):
         ordering = ('id',)
         verbose_name = 'Ingredient with quantities'
         verbose_name_plural = 'Ingredients with quantities'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('product', 'amount'),
+                name='unique_ingredient_product_amount'
+            ),
+        )
 
     def __str__(self):
         return (
@@ -104,9 +147,27 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=recipe_image_storage,
+        max_length=255,
         verbose_name='Picture',
         help_text='Link to picture'
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/images/',
+        storage=recipe_image_storage,
+        max_length=255,
+        blank=True,
+        verbose_name='Thumbnail',
+        help_text='Small picture for recipe lists'
+    )
+    image_detail = models.ImageField(
+        upload_to='recipes/images/',
+        storage=recipe_image_storage,
+        max_length=255,
+        blank=True,
+        verbose_name='Detail picture',
+        help_text='Picture resized for the recipe page'
+    )
     text = models.TextField(
         verbose_name='Description',
         help_text='Recipe description'
@@ -134,6 +195,24 @@ class Recipe(models.Model):
             )
         ]
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='In favorites',
+        help_text='Number of users who added the recipe to favorites'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='In shopping carts',
+        help_text='Number of users who added the recipe to shopping cart'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Updated',
+        help_text='Time of the last change'
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -163,6 +242,12 @@ class IngredientRecipe(models.Model):
         ordering = ('id',)
         verbose_name = 'IngredientRecipe'
         verbose_name_plural = 'IngredientRecipe'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_ingredient_recipe'
+            ),
+        )
 
 
 class TagRecipe(models.Model):
@@ -184,6 +269,12 @@ class TagRecipe(models.Model):
         ordering = ('id',)
         verbose_name = 'TagRecipe'
         verbose_name_plural = 'TagRecipe'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'tag'),
+                name='unique_tag_recipe'
+            ),
+        )
 
 
 class Favorite(models.Model):
@@ -207,6 +298,12 @@ class Favorite(models.Model):
         ordering = ('-id',)
         verbose_name = 'Favorite'
         verbose_name_plural = 'Favorites'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite_user_recipe'
+            ),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -230,3 +327,9 @@ class ShoppingCart(models.Model):
         ordering = ('-id',)
         verbose_name = 'ShoppingCart'
         verbose_name_plural = 'ShoppingCarts'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart_user_recipe'
+            ),
+        )
@@ -1,6 +1,128 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def estimate_count(queryset):
+    """Row count of the table from PostgreSQL statistics, None elsewhere"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            (queryset.model._meta.db_table,)
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] > 0 else None
+
+
+def count_cache_key(request, view, ignored_params):
+    """Cache key of a list count: the view, the viewer and the filters"""
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+        if name not in ignored_params
+    )
+    return 'pagination_count:' + hashlib.sha256(repr((
+        view.__class__.__name__ if view is not None else None,
+        request.user.pk,
+        params,
+    )).encode()).hexdigest()
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """Paginator that caches the count under count_key
+
+    Large tables listed without filters get the planner's estimate
+    instead, "count_is_exact" tells which one was used.
+    """
+    count_is_exact = True
+
+    def __init__(self, *args, count_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset)
+            if (
+                estimate is not None
+                and estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+            ):
+                self.count_is_exact = False
+                return estimate
+        if self.count_key is None:
+            return queryset.count()
+        count = cache.get(self.count_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(
+                self.count_key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            )
+        return count
 
 
 class PaginationWithLimit(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Counts do not depend on the page, so it is not a part of the key
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            count_key=count_cache_key(request, view, (
+                self.page_query_param, self.page_size_query_param
+            ))
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response['X-Count-Exact'] = str(
+            self.page.paginator.count_is_exact
+        ).lower()
+        return response
+
+
+class CursorPaginationWithLimit(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class PaginationWithCursor(PaginationWithLimit):
+    """Page number pagination with an opt-in keyset mode
+
+    "?cursor=" (empty for the first page) switches to cursor pagination:
+    pages are fetched by position in the view "ordering" (which must be
+    unique) instead of OFFSET, and the response has no "count".
+    """
+    cursor_pagination_class = CursorPaginationWithLimit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = getattr(
+                view, 'ordering', None
+            ) or self.cursor_paginator.ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
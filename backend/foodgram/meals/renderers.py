@@ -0,0 +1,104 @@
+import csv
+import json
+
+from rest_framework import renderers
+
+
+class Echo:
+    """Pseudo-buffer: csv.writer returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Base shopping list renderer
+
+    The shopping list itself is streamed with stream(), render() is
+    only used by DRF for error responses.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, recipes, totals):
+        raise NotImplementedError('stream() must be implemented.')
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Shopping list in CSV"""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, recipes, totals):
+        writer = csv.writer(Echo())
+        yield writer.writerow(['Shopping list', ])
+        yield writer.writerow([])
+        for recipe_num, (name, ingredients) in enumerate(recipes, 1):
+            yield writer.writerow(['Recipe #', recipe_num, name])
+            for ingredient_num, ingredient in enumerate(ingredients, 1):
+                yield writer.writerow([ingredient_num, *ingredient])
+            yield writer.writerow([])
+        yield writer.writerow(['Sum'])
+        for ingredient_num, ingredient in enumerate(totals, 1):
+            yield writer.writerow([ingredient_num, *ingredient])
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Shopping list in plain text"""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, recipes, totals):
+        yield 'Shopping list\n\n'
+        for recipe_num, (name, ingredients) in enumerate(recipes, 1):
+            yield f'Recipe #{recipe_num}: {name}\n'
+            for ingredient_num, (product, amount, unit) in enumerate(
+                ingredients, 1
+            ):
+                yield f'  {ingredient_num}. {product} - {amount:g} {unit}\n'
+            yield '\n'
+        yield 'Sum\n'
+        for ingredient_num, (product, amount, unit) in enumerate(totals, 1):
+            yield f'  {ingredient_num}. {product} - {amount:g} {unit}\n'
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    """Shopping list in JSON"""
+    media_type = 'application/json'
+    format = 'json'
+
+    @staticmethod
+    def _ingredient(product, amount, unit):
+        return {'name': product, 'amount': amount, 'measurement_unit': unit}
+
+    def stream(self, recipes, totals):
+        yield '{"recipes": ['
+        for recipe_num, (name, ingredients) in enumerate(recipes):
+            yield ', ' * bool(recipe_num) + json.dumps(
+                {
+                    'name': name,
+                    'ingredients': [
+                        self._ingredient(*ingredient)
+                        for ingredient in ingredients
+                    ]
+                },
+                ensure_ascii=False
+            )
+        yield '], "sum": ['
+        for ingredient_num, ingredient in enumerate(totals):
+            yield ', ' * bool(ingredient_num) + json.dumps(
+                self._ingredient(*ingredient), ensure_ascii=False
+            )
+        yield ']}'
+
+
+# The first renderer is used when the client does not ask for a format
+SHOPPING_LIST_RENDERERS = (
+    CSVShoppingListRenderer,
+    TextShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from rest_framework import serializers
 
 from users.serializers import UserSerializer
@@ -7,7 +7,6 @@ from users.serializers import UserSerializer
 from .models import (
     Favorite,
     Ingredient,
-    IngredientRecipe,
     Product,
     Recipe,
     ShoppingCart,
@@ -16,8 +15,14 @@ from .models import (
 )
 from .utils import (
     Base64ImageField,
+    RecipeImageField,
     check_ingredients_and_tags,
-    create_ingredients
+    create_ingredients,
+    invalidate_recipe_shopping_lists,
+    same_image,
+    set_image,
+    update_ingredients,
+    update_tags
 )
 
 User = get_user_model()
@@ -58,7 +63,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class IngredientSerializerForWrite(serializers.ModelSerializer):
     """Ingredient write serializer"""
-    id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = Ingredient
@@ -69,7 +74,7 @@ class IngredientSerializerForWrite(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Recipe serializer"""
-    image = Base64ImageField()
+    image = RecipeImageField()
     tags = TagSerializer(many=True)
     author = UserSerializer()
     ingredients = IngredientSerializer(many=True)
@@ -102,11 +107,29 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
             'image', 'text', 'cooking_time'
         )
 
+    def validate_ingredients(self, ingredients):
+        # All products of the recipe are fetched with one query
+        products = Product.objects.in_bulk(
+            [ingredient['id'] for ingredient in ingredients]
+        )
+        for ingredient in ingredients:
+            if ingredient['id'] not in products:
+                raise serializers.ValidationError(
+                    f'Invalid pk "{ingredient["id"]}" - '
+                    'object does not exist.'
+                )
+            ingredient['id'] = products[ingredient['id']]
+        return ingredients
+
     def to_representation(self, value):
         # Adding annotations for filtering
         is_favorited = Favorite.objects.none()
         is_in_shopping_cart = ShoppingCart.objects.none()
-        value = Recipe.objects.filter(id=value.id).annotate(
+        value = Recipe.objects.filter(id=value.id).select_related(
+            'author'
+        ).prefetch_related(
+            'tags', 'ingredients', 'ingredients__product'
+        ).annotate(
             is_favorited=models.Exists(is_favorited),
             is_in_shopping_cart=models.Exists(is_in_shopping_cart)
         ).first()
@@ -118,9 +141,10 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
         # Pop ingredients and tags (nested serializer)
         ingredients_ord_dict = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(
-            **validated_data, author=self.context['request'].user
-        )
+        image = validated_data.pop('image')
+        recipe = Recipe(**validated_data, author=self.context['request'].user)
+        set_image(recipe, image)
+        recipe.save()
         create_ingredients(ingredients_ord_dict, recipe)
         tags_list = []
         for tag in tags:
@@ -128,22 +152,23 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
         TagRecipe.objects.bulk_create(tags_list)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         check_ingredients_and_tags(validated_data)
         instance.author = self.context['request'].user
         instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        if image is not None and not same_image(instance.image, image):
+            set_image(instance, image)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time',
             instance.cooking_time
         )
         instance.save()
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        ingredients_ord_dict = validated_data.pop('ingredients')
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        create_ingredients(ingredients_ord_dict, instance)
+        update_tags(validated_data.pop('tags'), instance)
+        update_ingredients(validated_data.pop('ingredients'), instance)
+        invalidate_recipe_shopping_lists(instance.id)
         return instance
 
 
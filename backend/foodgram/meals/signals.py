@@ -0,0 +1,75 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .models import (
+    CatalogVersion,
+    Favorite,
+    Ingredient,
+    Product,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from .utils import (
+    change_counter,
+    invalidate_ingredient_shopping_lists,
+    invalidate_product_shopping_lists,
+    invalidate_recipes,
+    invalidate_shopping_lists
+)
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    invalidate_shopping_lists((instance.user_id,))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def catalog_changed(sender, **kwargs):
+    CatalogVersion.bump()
+    invalidate_recipes()
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    # Shopping lists show the name and the measurement unit of products
+    if not created:
+        invalidate_product_shopping_lists(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_recipes()
+
+
+# Before a deletion, while the recipes still refer to the ingredient
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_shopping_lists_changed(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        invalidate_ingredient_shopping_lists(instance.pk)
+
+
+# Deletions update the counters in bulk, see delete_counted()
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_link_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, RECIPE_COUNTERS[sender], 1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
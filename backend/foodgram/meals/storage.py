@@ -0,0 +1,61 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that names files after the SHA-256 of their content
+
+    Files go to "<upload_to>/ab/cd/<sha256>.<ext>". Saving content that
+    is already stored writes nothing and returns the existing name, so
+    identical pictures share one file, its modification time is updated.
+    Files are never removed when a recipe changes: the gc_media command
+    deletes old ones no recipe refers to anymore.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is chosen in _save() from the content
+        return name
+
+    def _save(self, name, content):
+        content_hash = hashlib.sha256()
+        for chunk in content.chunks():
+            content_hash.update(chunk)
+        digest = content_hash.hexdigest()
+        name = os.path.join(
+            os.path.dirname(name),
+            digest[:2],
+            digest[2:4],
+            digest + os.path.splitext(name)[1].lower()
+        )
+        full_path = self.path(name)
+        try:
+            # A fresh modification time keeps gc_media from removing the
+            # file before the recipe that reuses it is saved
+            os.utime(full_path, None)
+            return name
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent uploads of the same content replace the file with
+        # identical bytes, so a temporary file and os.replace() are enough
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,651 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate
+)
+
+from users.models import Subscription, User
+
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Product,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagRecipe
+)
+from .representations import RECIPE_VALUES, recipe_representations
+from .serializers import RecipeSerializer
+from .storage import recipe_image_storage
+from .utils import (
+    Base64ImageField,
+    delete_counted,
+    image_variants,
+    search_products,
+    set_image,
+    shopping_list_version
+)
+from .views import RecipeViewSet
+
+
+def encoded_image(size, image_format='PNG', mode='RGB', **params):
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, image_format, **params)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def use_temporary_media(test):
+    """Store the files saved by the test in a directory removed after it"""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+class RecipeListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Recipe', image='recipes/images/a.png',
+            text='Text', cooking_time=10
+        )
+        Favorite.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_link_filters(self):
+        for query, count in (
+            ('is_favorited=1', 0),
+            ('is_favorited=0', 1),
+            ('is_in_shopping_cart=1', 0),
+        ):
+            with self.subTest(query=query):
+                response = APIClient().get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['count'], count)
+
+    def test_count_cache_key_depends_on_user(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get('/api/recipes/?is_favorited=1')
+        self.assertEqual(response.json()['count'], 1)
+        response = APIClient().get('/api/recipes/?is_favorited=1')
+        self.assertEqual(response.json()['count'], 0)
+
+
+class RecipeWriteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+        cls.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        cls.products = [
+            Product.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'flour', 'sugar', 'yeast', 'butter')
+        ]
+
+    def setUp(self):
+        use_temporary_media(self)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def payload(self, products, **fields):
+        return {
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': product.pk, 'amount': 10 * (number + 1)}
+                for number, product in enumerate(products)
+            ],
+            'name': 'Recipe',
+            'image': 'data:image/png;base64,' + encoded_image((8, 8)),
+            'text': 'Text',
+            'cooking_time': 10,
+            **fields
+        }
+
+    def test_new_ingredients_keep_request_order(self):
+        products = self.products[::-1]
+        response = self.client.post(
+            '/api/recipes/', self.payload(products), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()[
+                'ingredients'
+            ]],
+            [product.name for product in products]
+        )
+
+    def test_unchanged_image_is_not_resized(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload(self.products[:1]), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        with mock.patch(
+            'meals.utils.image_variants', wraps=image_variants
+        ) as variants:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/',
+                self.payload(self.products[:1]), format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            variants.assert_not_called()
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/',
+                self.payload(
+                    self.products[:1], image='data:image/png;base64,'
+                    + encoded_image((9, 9))
+                ),
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            variants.assert_called_once()
+        thumbnail = recipe.image_thumbnail.name
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image_thumbnail.name, thumbnail)
+
+
+class RecipeCacheStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Recipe', image='recipes/images/a.png',
+            text='Text', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self):
+        return cache.get_many(
+            ('cache_stats:recipe:hits', 'cache_stats:recipe:misses')
+        )
+
+    def get_recipe_twice(self):
+        for _ in range(2):
+            response = APIClient().get(f'/api/recipes/{self.recipe.pk}/')
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(CACHE_STATS=True, CACHE_STATS_FLUSH_INTERVAL=0)
+    def test_counted(self):
+        self.get_recipe_twice()
+        self.assertEqual(self.stats(), {
+            'cache_stats:recipe:hits': 1, 'cache_stats:recipe:misses': 1
+        })
+
+    def test_off_by_default(self):
+        self.get_recipe_twice()
+        self.assertEqual(self.stats(), {})
+
+
+class RecipeRepresentationsTests(TestCase):
+    """Recipe lists built from rows match RecipeSerializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='password'
+            )
+            for name in ('user', 'author')
+        )
+        Subscription.objects.create(
+            user=cls.user, subscription_to_user=cls.author
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Tag {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                product=Product.objects.create(
+                    name=f'product{number}', measurement_unit='g'
+                ),
+                amount=number + 0.5
+            )
+            for number in range(3)
+        ]
+        for number, author in enumerate((cls.author, cls.author, cls.user)):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Recipe {number}',
+                image=f'recipes/images/{number}.png',
+                # The first recipe has no thumbnail, the picture is used
+                image_thumbnail=(
+                    f'recipes/images/{number}_thumbnail.webp' if number
+                    else ''
+                ),
+                text='Text', cooking_time=10 + number
+            )
+            for tag in tags[number % 2:]:
+                TagRecipe.objects.create(recipe=recipe, tag=tag)
+            for ingredient in ingredients[number:]:
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient
+                )
+            if number == 0:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number == 1:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def assertSameAsSerializer(self, user):
+        request = APIRequestFactory().get('/api/recipes/')
+        force_authenticate(request, user)
+        view = RecipeViewSet(
+            action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={}
+        )
+        view.request = view.initialize_request(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        representations = recipe_representations(
+            list(queryset.values(*RECIPE_VALUES)),
+            view.get_serializer_context(),
+            'image_thumbnail'
+        )
+        data = RecipeSerializer(
+            queryset, many=True, context=view.get_serializer_context()
+        ).data
+        self.assertEqual(representations, data)
+        # Key order and number formatting as well
+        self.assertEqual(
+            JSONRenderer().render(representations),
+            JSONRenderer().render(data)
+        )
+        return representations
+
+    def test_authenticated(self):
+        representations = self.assertSameAsSerializer(self.user)
+        self.assertEqual(
+            [(recipe['is_favorited'], recipe['is_in_shopping_cart'])
+             for recipe in representations],
+            [(False, False), (False, True), (True, False)]
+        )
+        self.assertTrue(representations[1]['author']['is_subscribed'])
+
+    def test_anonymous(self):
+        self.assertSameAsSerializer(None)
+
+
+class DeleteCountedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='password'
+            )
+            for name in ('author', 'reader', 'other')
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Recipe {number}',
+                image='recipes/images/a.png', text='Text', cooking_time=10
+            )
+            for number in range(3)
+        ]
+        for user in (cls.reader, cls.other):
+            for recipe in cls.recipes:
+                Favorite.objects.create(user=user, recipe=recipe)
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+            Subscription.objects.create(
+                user=user, subscription_to_user=cls.author
+            )
+
+    def assertCounters(self, model, field, expected):
+        self.assertEqual(
+            dict(model.objects.values_list('pk', field)), expected
+        )
+
+    def test_delete_user(self):
+        delete_counted(User.objects.filter(pk=self.reader.pk))
+        self.assertCounters(
+            Recipe, 'favorites_count',
+            {recipe.pk: 1 for recipe in self.recipes}
+        )
+        self.assertCounters(
+            Recipe, 'cart_count', {recipe.pk: 1 for recipe in self.recipes}
+        )
+        self.assertCounters(
+            User, 'followers_count', {self.author.pk: 1, self.other.pk: 0}
+        )
+
+    def test_delete_recipes(self):
+        version = shopping_list_version(self.reader.pk)
+        delete_counted(Recipe.objects.filter(pk__in=[
+            recipe.pk for recipe in self.recipes[:2]
+        ]))
+        self.assertCounters(User, 'recipes_count', {
+            self.author.pk: 1, self.reader.pk: 0, self.other.pk: 0
+        })
+        self.assertNotEqual(shopping_list_version(self.reader.pk), version)
+
+    def test_delete_links_with_one_update(self):
+        with self.assertNumQueries(5):
+            # Savepoint, counts, one UPDATE, one DELETE, release
+            delete_counted(Favorite.objects.filter(user=self.reader))
+        self.assertCounters(
+            Recipe, 'favorites_count',
+            {recipe.pk: 1 for recipe in self.recipes}
+        )
+
+    def test_destroy_recipe(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+
+class RecipeLinkTests(TestCase):
+    """Adding a recipe to favorites and to the shopping cart"""
+
+    endpoints = (
+        ('favorite', 'favorites_count'),
+        ('shopping_cart', 'cart_count'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='password'
+            )
+            for name in ('author', 'reader')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Recipe', image='recipes/images/a.png',
+            text='Text', cooking_time=10
+        )
+        # Keeps the counters off zero, where they stop going down
+        Favorite.objects.create(user=cls.author, recipe=cls.recipe)
+        ShoppingCart.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def assertCount(self, field, expected):
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, field), expected)
+
+    def test_add_and_remove(self):
+        for endpoint, field in self.endpoints:
+            with self.subTest(endpoint=endpoint):
+                path = f'/api/recipes/{self.recipe.pk}/{endpoint}/'
+                response = self.client.post(path)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['name'], 'Recipe')
+                self.assertCount(field, 2)
+                response = self.client.post(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertCount(field, 2)
+                response = self.client.delete(path)
+                self.assertEqual(response.status_code, 204)
+                self.assertCount(field, 1)
+                response = self.client.delete(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertCount(field, 1)
+
+    def test_missing_recipe(self):
+        missing = Recipe.objects.order_by('pk').last().pk + 1
+        for endpoint, _ in self.endpoints:
+            path = f'/api/recipes/{missing}/{endpoint}/'
+            for method in (self.client.post, self.client.delete):
+                with self.subTest(endpoint=endpoint, method=method.__name__):
+                    self.assertEqual(method(path).status_code, 404)
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+
+    def test_decode(self):
+        data = Base64ImageField().decode(encoded_image((64, 32)))
+        self.assertEqual(data.name, f'{data.content_hash}.png')
+        recipe = Recipe()
+        set_image(recipe, data)
+        self.assertEqual(recipe.image, data)
+        self.assertTrue(
+            recipe.image_thumbnail.name.startswith(data.content_hash)
+        )
+        self.assertTrue(recipe.image_detail.name.startswith(data.content_hash))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels(self):
+        encoded = encoded_image((101, 100))
+        with mock.patch.object(Image.Image, 'load') as load:
+            with self.assertRaises(ValidationError) as error:
+                Base64ImageField().decode(encoded)
+        self.assertEqual(error.exception.detail[0].code, 'too_many_pixels')
+        load.assert_not_called()
+
+    def test_decompression_bomb(self):
+        encoded = encoded_image((101, 100))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            with self.assertRaises(ValidationError) as error:
+                Base64ImageField().decode(encoded)
+        self.assertEqual(error.exception.detail[0].code, 'invalid_image')
+
+
+class ImageVariantsTests(SimpleTestCase):
+
+    def open(self, encoded):
+        return Image.open(io.BytesIO(base64.b64decode(encoded)))
+
+    def test_large_jpeg_is_shrunk_once(self):
+        image = self.open(encoded_image((4000, 3000), 'JPEG'))
+        with mock.patch.object(
+            Image.Image, 'thumbnail', autospec=True,
+            side_effect=Image.Image.thumbnail
+        ) as thumbnail:
+            variants = image_variants(image)
+        for call in thumbnail.call_args_list:
+            self.assertLess(max(call.args[0].size), 2 * 1280)
+        detail = Image.open(io.BytesIO(variants['image_detail'][0]))
+        self.assertEqual(detail.size, (1280, 960))
+
+    def test_transparency_is_kept(self):
+        for image_format, mode in (('PNG', 'P'), ('GIF', 'P'), ('PNG', 'L')):
+            with self.subTest(image_format=image_format, mode=mode):
+                image = self.open(encoded_image(
+                    (20, 20), image_format, mode=mode, transparency=0
+                ))
+                variants = image_variants(image)
+                variant = Image.open(
+                    io.BytesIO(variants['image_thumbnail'][0])
+                )
+                if variant.format == 'WEBP':
+                    self.assertEqual(variant.mode, 'RGBA')
+                    self.assertEqual(variant.getpixel((0, 0))[3], 0)
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        use_temporary_media(self)
+
+    def test_reupload_is_not_collected(self):
+        name = recipe_image_storage.save(
+            'recipes/images/a.png', ContentFile(b'picture')
+        )
+        path = recipe_image_storage.path(name)
+        old = time.time() - 2 * 60 * 60
+        os.utime(path, (old, old))
+        self.assertEqual(
+            recipe_image_storage.save(
+                'recipes/images/b.png', ContentFile(b'picture')
+            ),
+            name
+        )
+        self.assertGreater(os.path.getmtime(path), old)
+        call_command('gc_media', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_unreferenced_old_file_is_collected(self):
+        name = recipe_image_storage.save(
+            'recipes/images/a.png', ContentFile(b'picture')
+        )
+        path = recipe_image_storage.path(name)
+        old = time.time() - 2 * 60 * 60
+        os.utime(path, (old, old))
+        call_command('gc_media', stdout=io.StringIO())
+        self.assertFalse(os.path.exists(path))
+
+
+class ShoppingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='User', last_name='User', password='password'
+        )
+        cls.product = Product.objects.create(
+            name='flour', measurement_unit='g'
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user, name='Bread', image='recipes/images/a.png',
+            text='Text', cooking_time=60
+        )
+        cls.ingredient = Ingredient.objects.create(
+            product=cls.product, amount=500
+        )
+        IngredientRecipe.objects.create(
+            recipe=recipe, ingredient=cls.ingredient
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        return response.getvalue().decode()
+
+    def test_ingredient_change_invalidates_list(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertIn('500.0', response.getvalue().decode())
+        self.ingredient.amount = 750
+        self.ingredient.save()
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('750.0', response.getvalue().decode())
+
+    def test_product_change_invalidates_list(self):
+        self.assertIn('flour', self.download())
+        self.product.name = 'rye flour'
+        self.product.measurement_unit = 'kg'
+        self.product.save()
+        shopping_list = self.download()
+        self.assertIn('rye flour', shopping_list)
+        self.assertIn('kg', shopping_list)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL plans')
+class IndexUsageTests(TestCase):
+    """Hot lookups can be answered from indexes
+
+    Sequential scans are disabled, so the planner only picks one when no
+    index fits the query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='password'
+            )
+            for name in ('user', 'author')
+        )
+        cls.tag = Tag.objects.create(name='Tag', color='#000000', slug='tag')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Recipe', image='recipes/images/a.png',
+            text='Text', cooking_time=10
+        )
+        cls.product = Product.objects.create(
+            name='flour', measurement_unit='g'
+        )
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertNoSeqScan(self, queryset, model):
+        self.assertNotIn(
+            f'Seq Scan on {model._meta.db_table}', queryset.explain()
+        )
+
+    def test_links(self):
+        outer_recipe = models.OuterRef('pk')
+        for queryset, model in (
+            (Favorite.objects.filter(user=self.user, recipe=self.recipe),
+             Favorite),
+            (ShoppingCart.objects.filter(user=self.user, recipe=self.recipe),
+             ShoppingCart),
+            (Recipe.objects.filter(models.Exists(Favorite.objects.filter(
+                user=self.user, recipe=outer_recipe
+            ))), Favorite),
+            (Subscription.objects.filter(
+                user=self.user, subscription_to_user=self.author
+            ), Subscription),
+            (Subscription.objects.filter(user=self.user), Subscription),
+            (Recipe.objects.filter(models.Exists(TagRecipe.objects.filter(
+                recipe=outer_recipe, tag=self.tag
+            ))), TagRecipe),
+            (IngredientRecipe.objects.filter(recipe=self.recipe),
+             IngredientRecipe),
+            (Recipe.objects.filter(author=self.author), Recipe),
+        ):
+            with self.subTest(query=str(queryset.query)):
+                self.assertNoSeqScan(queryset, model)
+
+    def test_product_search(self):
+        self.assertNoSeqScan(
+            search_products(Product.objects.all(), 'lou'), Product
+        )
@@ -1,23 +1,194 @@
 import base64
-import csv
+import binascii
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from functools import lru_cache
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Greatest
+from PIL import Image, ImageOps, features
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .models import Ingredient, IngredientRecipe, ShoppingCart
+from foodgram.renderers import fragment
+from users.models import Subscription, User
+
+from .models import (
+    CatalogVersion,
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Product,
+    Recipe,
+    ShoppingCart,
+    TagRecipe
+)
+
+# Counter columns and the rows they count: (model, counter field, related
+# model, related field)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'subscription_to_user'),
+)
 
 
 class Base64ImageField(serializers.ImageField):
-    """ImageField custom serializer"""
+    """ImageField custom serializer
+
+    A data URI is decoded chunk by chunk into a spooled temporary file,
+    checked with Pillow and named after the SHA-256 of its content,
+    which is also kept as "content_hash". Resized variants are only made
+    by set_image(), when the picture is stored.
+    """
+    default_error_messages = {
+        'too_large': 'The picture cannot be larger than {max_size} bytes',
+        'too_many_pixels': 'The picture cannot have more than {max_pixels} '
+                           'pixels',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data.split(';base64,', 1)[-1])
+            return serializers.FileField.to_internal_value(self, data)
         return super().to_internal_value(data)
 
+    def decode(self, imgstr):
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(imgstr) // 4 * 3 > max_size + 2:
+            self.fail('too_large', max_size=max_size)
+        content = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        content_hash = hashlib.sha256()
+        chunk_size = 4 * 16 * 1024
+        try:
+            for start in range(0, len(imgstr), chunk_size):
+                chunk = base64.b64decode(imgstr[start:start + chunk_size])
+                content_hash.update(chunk)
+                content.write(chunk)
+            content.seek(0)
+            with Image.open(content) as image:
+                image_format = image.format
+                # Only the header is read yet, pixels are decoded by load()
+                width, height = image.size
+                if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                    content.close()
+                    self.fail(
+                        'too_many_pixels',
+                        max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+                    )
+                image.verify()
+            ext = IMAGE_FORMATS[image_format]
+        except (
+            binascii.Error, Image.DecompressionBombError, KeyError, OSError,
+            SyntaxError, ValueError
+        ):
+            content.close()
+            self.fail('invalid_image')
+        content.seek(0)
+        data = File(content, name=f'{content_hash.hexdigest()}.{ext}')
+        data.content_hash = content_hash.hexdigest()
+        return data
+
+
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def image_variants(image):
+    """Pictures resized for RECIPE_IMAGE_VARIANTS, in WebP or JPEG
+
+    The picture is shrunk once to about the largest variant box, JPEG
+    while decoding, and every variant is made from that smaller copy.
+    """
+    box = max(max(size) for size in settings.RECIPE_IMAGE_VARIANTS.values())
+    scale = max(image.size) / box
+    if scale > 1:
+        image.draft(None, (
+            int(image.width / scale), int(image.height / scale)
+        ))
+    image = ImageOps.exif_transpose(image)
+    # Palette and grayscale pictures keep a transparent color in info
+    if 'transparency' in image.info:
+        image = image.convert('RGBA')
+    if features.check('webp'):
+        image_format, ext = 'WEBP', 'webp'
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    else:
+        image_format, ext = 'JPEG', 'jpg'
+        image = image.convert('RGB')
+    factor = max(image.size) // box
+    if factor > 1:
+        image = image.reduce(factor)
+    variants = {}
+    for field, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail(size)
+        buffer = io.BytesIO()
+        variant.save(buffer, image_format, quality=85)
+        variants[field] = buffer.getvalue(), ext
+    return variants
+
+
+def set_image(recipe, image):
+    """Set the picture of the recipe together with its resized variants
+
+    Variants are made for pictures decoded by Base64ImageField, callers
+    check first that the picture is not the stored one (same_image).
+    """
+    recipe.image = image
+    content_hash = getattr(image, 'content_hash', None)
+    if content_hash is None:
+        return
+    image.seek(0)
+    try:
+        with Image.open(image) as picture:
+            variants = image_variants(picture)
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise ValidationError({
+            'image': serializers.ImageField.default_error_messages[
+                'invalid_image'
+            ]
+        })
+    image.seek(0)
+    for field, (variant, ext) in variants.items():
+        setattr(recipe, field, ContentFile(
+            variant, name=f'{content_hash}_{field}.{ext}'
+        ))
+
+
+class RecipeImageField(serializers.ImageField):
+    """Read-only recipe picture, a resized variant when there is one
+
+    Without an explicit variant, list views get the thumbnail and other
+    views get the detail size.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        variant = self.variant
+        if variant is None:
+            view = self.context.get('view')
+            variant = (
+                'image_thumbnail' if getattr(view, 'action', None) == 'list'
+                else 'image_detail'
+            )
+        return getattr(instance, variant) or instance.image
+
 
 def check_ingredients_and_tags(validated_data):
     ingredients_ord_dict = validated_data.get('ingredients')
@@ -64,56 +235,399 @@ def image_url(shopping_cart_serializer, obj):
     return request.build_absolute_uri(image)
 
 
+def get_ingredients(pairs):
+    """Ingredients for the (product id, amount) pairs, keyed by the pair"""
+    if not pairs:
+        return {}
+    condition = models.Q()
+    for product_id, amount in pairs:
+        condition |= models.Q(product_id=product_id, amount=amount)
+    return {
+        (ingredient.product_id, ingredient.amount): ingredient
+        for ingredient in Ingredient.objects.filter(condition)
+    }
+
+
+def get_or_create_ingredients(ingredients_ord_dict):
+    """Ingredients of the recipe, in the order of the request"""
+    pairs = [
+        (ingredient_ord_dict['id'].id, ingredient_ord_dict['amount'])
+        for ingredient_ord_dict in ingredients_ord_dict
+    ]
+    ingredients = get_ingredients(pairs)
+    # New rows get ids, and so their place in the recipe, in request order
+    missing = [
+        pair for pair in dict.fromkeys(pairs) if pair not in ingredients
+    ]
+    if missing:
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(product_id=product_id, amount=amount)
+                for product_id, amount in missing
+            ],
+            ignore_conflicts=True
+        )
+        ingredients.update(get_ingredients(missing))
+    return [ingredients[pair] for pair in pairs]
+
+
 def create_ingredients(ingredients_ord_dict, recipe):
-    ingredients_list = []
-    for ingredient_ord_dict in ingredients_ord_dict:
-        ingredient, _created = Ingredient.objects.get_or_create(
-            product=ingredient_ord_dict['id'],
-            amount=ingredient_ord_dict['amount']
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(ingredient=ingredient, recipe=recipe)
+        for ingredient in get_or_create_ingredients(ingredients_ord_dict)
+    )
+
+
+def update_ingredients(ingredients_ord_dict, recipe):
+    """Add and remove only the ingredients that have changed"""
+    ingredient_ids = [
+        ingredient.id
+        for ingredient in get_or_create_ingredients(ingredients_ord_dict)
+    ]
+    current_ids = set(
+        IngredientRecipe.objects.filter(recipe=recipe).values_list(
+            'ingredient_id', flat=True
         )
-        ingredients_list.append(
-            IngredientRecipe(ingredient=ingredient, recipe=recipe)
+    )
+    removed_ids = current_ids - set(ingredient_ids)
+    if removed_ids:
+        IngredientRecipe.objects.filter(
+            recipe=recipe, ingredient_id__in=removed_ids
+        ).delete()
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(ingredient_id=ingredient_id, recipe=recipe)
+        for ingredient_id in ingredient_ids
+        if ingredient_id not in current_ids
+    )
+
+
+def update_tags(tags, recipe):
+    """Add and remove only the tags that have changed"""
+    tag_ids = [tag.id for tag in tags]
+    current_ids = set(
+        TagRecipe.objects.filter(recipe=recipe).values_list(
+            'tag_id', flat=True
         )
-    IngredientRecipe.objects.bulk_create(ingredients_list)
+    )
+    removed_ids = current_ids - set(tag_ids)
+    if removed_ids:
+        TagRecipe.objects.filter(
+            recipe=recipe, tag_id__in=removed_ids
+        ).delete()
+    TagRecipe.objects.bulk_create(
+        TagRecipe(tag_id=tag_id, recipe=recipe)
+        for tag_id in tag_ids
+        if tag_id not in current_ids
+    )
 
 
-def generate_file(request, response):
-    shopping_cart = ShoppingCart.objects.select_related('recipe').filter(
-        user=request.user
+def same_image(image, data):
+    """Check: the uploaded file has the content of the stored image"""
+    content_hash = getattr(data, 'content_hash', None)
+    return bool(
+        image and content_hash
+        and os.path.basename(image.name).startswith(content_hash)
+    )
+
+
+def shopping_cart_recipes(user):
+    """Recipes from the shopping cart with their ingredients"""
+    shopping_cart = ShoppingCart.objects.filter(
+        user=user
+    ).select_related('recipe').prefetch_related(
+        models.Prefetch(
+            'recipe__ingredients',
+            queryset=Ingredient.objects.select_related('product')
+        )
     )
-    writer = csv.writer(response)
-    recipe_num = 1
-    ingredient_sum = {}
-    measurement_unit_sum = {}
-    writer.writerow(['Shopping list', ])
-    writer.writerow([])
     for row_from_shopping_cart in shopping_cart:
         recipe = row_from_shopping_cart.recipe
-        row = ['Recipe #', recipe_num, recipe.name]
-        writer.writerow(row)
-        ingredient_num = 1
-        for ingredient in recipe.ingredients.all():
-            row = [
-                ingredient_num,
+        yield recipe.name, [
+            (
                 ingredient.product.name,
                 ingredient.amount,
                 ingredient.product.measurement_unit
-            ]
-            writer.writerow(row)
-            if ingredient.product.name in ingredient_sum.keys():
-                ingredient_sum[ingredient.product.name] += ingredient.amount
-            else:
-                ingredient_sum[ingredient.product.name] = ingredient.amount
-                measurement_unit_sum[
-                    ingredient.product.name
-                ] = ingredient.product.measurement_unit
-            ingredient_num += 1
-        writer.writerow([])
-        recipe_num += 1
-    writer.writerow(['Sum'])
-    ingredient_num = 1
-    for product, amount in ingredient_sum.items():
-        row = [ingredient_num, product, amount, measurement_unit_sum[product]]
-        writer.writerow(row)
-        ingredient_num += 1
-    return response
+            )
+            for ingredient in recipe.ingredients.all()
+        ]
+
+
+def shopping_cart_totals(user):
+    """Total amount of every product from the shopping cart"""
+    ingredient_sum = IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient__product_id',
+        'ingredient__product__name',
+        'ingredient__product__measurement_unit'
+    ).annotate(
+        total=models.Sum('ingredient__amount')
+    ).order_by('ingredient__product__name', 'ingredient__product_id')
+    for row in ingredient_sum.iterator():
+        yield (
+            row['ingredient__product__name'],
+            row['total'],
+            row['ingredient__product__measurement_unit']
+        )
+
+
+def shopping_list(user):
+    """Shopping list data, shared by all shopping list renderers"""
+    return shopping_cart_recipes(user), shopping_cart_totals(user)
+
+
+def cached_version(key):
+    """Version token kept in the cache, created on first use"""
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def shopping_list_version(user_id):
+    """Current version of the user's shopping list"""
+    return cached_version(f'shopping_list_version:{user_id}')
+
+
+def invalidate_shopping_lists(user_ids):
+    """Give new versions to the shopping lists of the users"""
+    cache.set_many(
+        {
+            f'shopping_list_version:{user_id}': uuid.uuid4().hex
+            for user_id in user_ids
+        },
+        None
+    )
+
+
+def invalidate_recipe_shopping_lists(recipe_id):
+    """Invalidate the shopping lists containing the recipe"""
+    invalidate_shopping_lists(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        ).order_by().distinct()
+    )
+
+
+def invalidate_ingredient_shopping_lists(ingredient_id):
+    """Invalidate the shopping lists with the ingredient"""
+    invalidate_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe__ingredients=ingredient_id
+        ).values_list('user_id', flat=True).order_by().distinct()
+    )
+
+
+def invalidate_product_shopping_lists(product_id):
+    """Invalidate the shopping lists with ingredients of the product"""
+    invalidate_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe__ingredients__product_id=product_id
+        ).values_list('user_id', flat=True).order_by().distinct()
+    )
+
+
+def recipe_cache_key(request, recipe_id, updated_at):
+    """Cache key of the representation of the recipe as it is now
+
+    Recipe saves change updated_at, tag and ingredient changes change the
+    version. Absolute picture URLs depend on the host.
+    """
+    return (
+        f'recipe:{recipe_id}:{updated_at.timestamp()}:'
+        f'{cached_version("recipes_version")}:'
+        f'{request.build_absolute_uri("/")}'
+    )
+
+
+def invalidate_recipes():
+    """Drop cached representations of all recipes"""
+    cache.set('recipes_version', uuid.uuid4().hex, None)
+
+
+class CacheAccessCounters:
+    """Hit and miss counters of the caches, see cache_stats
+
+    Accesses are counted in the process and added to the shared counters
+    in the cache at most every CACHE_STATS_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count(self, name, hit):
+        key = f'cache_stats:{name}:{"hits" if hit else "misses"}'
+        now = time.monotonic()
+        with self._lock:
+            self.counts[key] += 1
+            if now - self.flushed < settings.CACHE_STATS_FLUSH_INTERVAL:
+                return
+            counts, self.counts = self.counts, Counter()
+            self.flushed = now
+        self.flush(counts)
+
+    def flush(self, counts):
+        for key, count in counts.items():
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+
+cache_access_counters = CacheAccessCounters()
+
+
+def count_cache_access(name, hit):
+    """Count an access to the cache if settings.CACHE_STATS is on"""
+    if settings.CACHE_STATS:
+        cache_access_counters.count(name, hit)
+
+
+def cache_stream(key, chunks):
+    """Pass the chunks through and cache them once streaming is finished"""
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(rendered), settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def search_products(queryset, name):
+    """Products starting with the name first, then containing it"""
+    return queryset.filter(name__icontains=name).annotate(
+        is_prefix=models.Case(
+            models.When(name__istartswith=name, then=True),
+            default=False,
+            output_field=models.BooleanField()
+        )
+    ).order_by('-is_prefix', 'name')
+
+
+@lru_cache(maxsize=settings.INGREDIENTS_AUTOCOMPLETE_CACHE_SIZE)
+def _autocomplete_products(name, limit, version):
+    return fragment(list(
+        search_products(Product.objects.all(), name).values(
+            'id', 'name', 'measurement_unit'
+        )[:limit]
+    ))
+
+
+def autocomplete_products(name):
+    """Cached search of products for the ingredient autocomplete
+
+    The result is encoded JSON, see foodgram.renderers.Fragment.
+    """
+    # Entries of older catalog versions are never hit again
+    return _autocomplete_products(
+        name.lower(),
+        settings.INGREDIENTS_AUTOCOMPLETE_LIMIT,
+        CatalogVersion.get_version()
+    )
+
+
+def add_link(model, user_id, field, target_id):
+    """Link the user to a row in one statement, return the new link id
+
+    Returns None when the link already exists or the row does not.
+    Relies on the unique constraint of the link table.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    target = opts.get_field(field)
+    target_column = quote(target.target_field.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(opts.db_table)} '
+            f'({quote(opts.get_field("user").column)}, '
+            f'{quote(target.column)}) '
+            f'SELECT %s, {target_column} '
+            f'FROM {quote(target.related_model._meta.db_table)} '
+            f'WHERE {target_column} = %s '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}',
+            (user_id, target_id)
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def remove_link(model, user_id, field, target_id):
+    """Unlink the user from a row in one statement, return if it was linked"""
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(opts.db_table)} '
+            f'WHERE {quote(opts.get_field("user").column)} = %s '
+            f'AND {quote(opts.get_field(field).column)} = %s',
+            (user_id, target_id)
+        )
+        return cursor.rowcount > 0
+
+
+def change_counter(model, pk, field, delta):
+    """Add delta to a counter column without reading it first"""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(models.F(field) + delta, 0)}
+    )
+
+
+def subtract_counts(rows, model, field, related_field):
+    """Take the rows off the counters of the rows they refer to
+
+    One UPDATE for every group of rows losing the same number.
+    """
+    by_count = defaultdict(list)
+    for pk, count in rows.order_by().values(related_field).annotate(
+        count=models.Count('pk')
+    ).values_list(related_field, 'count'):
+        by_count[count].append(pk)
+    for count, pks in by_count.items():
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(models.F(field) - count, 0)}
+        )
+
+
+def deleted_rows(queryset, model, skip_field=None):
+    """Querysets of the rows of the model deleted with the queryset
+
+    The queryset itself or the rows referring to it with CASCADE foreign
+    keys, except skip_field.
+    """
+    if model is queryset.model:
+        return [queryset]
+    return [
+        model.objects.filter(**{f'{field.name}__in': queryset.values('pk')})
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is queryset.model
+        and field.remote_field.on_delete is models.CASCADE
+        and field.name != skip_field
+    ]
+
+
+def delete_counted(queryset):
+    """Delete the rows, updating counters and shopping lists in bulk
+
+    There are no post_delete receivers for counted rows, they would make
+    Django delete cascades row by row. Deletions elsewhere leave the
+    counters for the recount command.
+    """
+    with transaction.atomic():
+        for model, field, related_model, related_field in COUNTERS:
+            # Counters of rows deleted as well do not matter
+            for rows in deleted_rows(queryset, related_model, related_field):
+                subtract_counts(rows, model, field, related_field)
+        user_ids = {
+            user_id
+            for rows in deleted_rows(queryset, ShoppingCart)
+            for user_id in rows.values_list('user_id', flat=True).distinct()
+        }
+        deleted = queryset.delete()
+    invalidate_shopping_lists(user_ids)
+    return deleted
@@ -1,16 +1,41 @@
-from django.db import models
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse
+)
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, permissions, status, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes,
+    renderer_classes
+)
+from rest_framework.exceptions import MethodNotAllowed, NotFound
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from foodgram.middleware import query_budget
+from foodgram.renderers import fragment
+from users.models import Subscription
+
+from .catalog import catalog
 from .filters import ProductFilter, RecipeFilter
 from .models import Favorite, Ingredient, Product, Recipe, ShoppingCart, Tag
-from .pagination import PaginationWithLimit
+from .pagination import PaginationWithCursor
 from .permissions import OwnerOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .representations import (
+    RECIPE_VALUES,
+    author_representation,
+    recipe_representations
+)
 from .serializers import (
     FavoriteSerializer,
     IngredientSerializer,
@@ -20,9 +45,44 @@ from .serializers import (
     ShoppingCartSerializer,
     TagSerializer
 )
-from .utils import generate_file
+from .utils import (
+    add_link,
+    autocomplete_products,
+    cache_stream,
+    change_counter,
+    count_cache_access,
+    delete_counted,
+    invalidate_shopping_lists,
+    recipe_cache_key,
+    remove_link,
+    shopping_list,
+    shopping_list_version
+)
 
 
+def not_modified(request, etag):
+    return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def catalog_response(request, name):
+    """Pre-rendered list of tags or products from the catalog"""
+    version = catalog.refresh()
+    etag = quote_etag(f'{name}-{version}')
+    if not_modified(request, etag):
+        response = HttpResponseNotModified(headers={'ETag': etag})
+    else:
+        response = HttpResponse(
+            catalog.rendered[name],
+            content_type='application/json',
+            headers={'ETag': etag}
+        )
+    patch_cache_control(
+        response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+    )
+    return response
+
+
+@query_budget(list=4)
 class TagViewSet(mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
@@ -32,7 +92,11 @@ class TagViewSet(mixins.ListModelMixin,
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return catalog_response(request, 'tags')
 
+
+@query_budget(list=4)
 class ProductViewSet(mixins.ListModelMixin,
                      mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
@@ -44,6 +108,12 @@ class ProductViewSet(mixins.ListModelMixin,
     filterset_class = ProductFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(autocomplete_products(name))
+        return catalog_response(request, 'products')
+
 
 class IngredientViewSet(mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
@@ -54,6 +124,7 @@ class IngredientViewSet(mixins.ListModelMixin,
     permission_classes = (permissions.AllowAny,)
 
 
+@query_budget(list=10, retrieve=8)
 class RecipeViewSet(mixins.ListModelMixin,
                     mixins.CreateModelMixin,
                     mixins.UpdateModelMixin,
@@ -62,7 +133,12 @@ class RecipeViewSet(mixins.ListModelMixin,
                     viewsets.GenericViewSet):
     """Recipe ViewSet"""
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter,)
-    pagination_class = PaginationWithLimit
+    pagination_class = PaginationWithCursor
+    ordering = ('-id',)
+    ordering_fields = (
+        'id', 'name', 'cooking_time', 'author', 'is_favorited',
+        'is_in_shopping_cart', 'favorites_count', 'cart_count'
+    )
     filterset_class = RecipeFilter
     filterset_fields = (
         'author', 'tags', 'is_favorited', 'is_in_shopping_cart'
@@ -83,6 +159,9 @@ class RecipeViewSet(mixins.ListModelMixin,
     def update(self, *args, **kwargs):
         raise MethodNotAllowed('PUT', detail='Use PATCH')
 
+    def perform_destroy(self, instance):
+        delete_counted(Recipe.objects.filter(pk=instance.pk))
+
     def partial_update(self, *args, **kwargs):
         return super().update(*args, **kwargs)
 
@@ -95,89 +174,188 @@ class RecipeViewSet(mixins.ListModelMixin,
             is_in_shopping_cart = ShoppingCart.objects.filter(
                 recipe=models.OuterRef('pk'), user=self.request.user
             )
+            is_subscribed = Subscription.objects.filter(
+                subscription_to_user=models.OuterRef('author'),
+                user=self.request.user
+            )
+            is_favorited = models.Exists(is_favorited)
+            is_in_shopping_cart = models.Exists(is_in_shopping_cart)
+            is_subscribed = models.Exists(is_subscribed)
         else:
-            is_favorited = Favorite.objects.none()
-            is_in_shopping_cart = ShoppingCart.objects.none()
-        return Recipe.objects.all().select_related('author').prefetch_related(
-            'tags', 'ingredients', 'ingredients__product').annotate(
-            is_favorited=models.Exists(is_favorited),
-            is_in_shopping_cart=models.Exists(is_in_shopping_cart)
+            # Exists() of an empty queryset cannot be compiled to SQL and
+            # filtering on it drops every row
+            is_favorited = is_in_shopping_cart = is_subscribed = models.Value(
+                False, output_field=models.BooleanField()
+            )
+        queryset = Recipe.objects.all().select_related('author').annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart
         )
+        if self.action == 'retrieve':
+            return queryset.annotate(is_subscribed=is_subscribed)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Plain rows and dicts instead of model instances and serializers
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(queryset.values(*RECIPE_VALUES))
+        return self.get_paginated_response(recipe_representations(
+            rows, self.get_serializer_context(), 'image_thumbnail'
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Only the viewer's flags and the author are not cached
+        row = get_object_or_404(
+            self.filter_queryset(self.get_queryset()).values(
+                *RECIPE_VALUES, 'is_subscribed', 'updated_at'
+            ),
+            pk=self.kwargs['pk']
+        )
+        context = self.get_serializer_context()
+        context['subscriptions'] = (
+            {row['author']} if row['is_subscribed'] else set()
+        )
+        key = recipe_cache_key(request, row['id'], row['updated_at'])
+        data = cache.get(key)
+        count_cache_access('recipe', data is not None)
+        if data is None:
+            data = recipe_representations([row], context, 'image_detail')[0]
+            cache.set(
+                key,
+                dict(
+                    data,
+                    tags=fragment(data['tags']),
+                    ingredients=fragment(data['ingredients']),
+                    author=None, is_favorited=None, is_in_shopping_cart=None
+                ),
+                settings.RECIPE_CACHE_TIMEOUT
+            )
+        data.update(
+            author=author_representation(row, context['subscriptions']),
+            is_favorited=bool(row['is_favorited']),
+            is_in_shopping_cart=bool(row['is_in_shopping_cart']),
+        )
+        return Response(data)
 
 
 class FavoriteAndShopCartMixin:
     """Mixin for Favorite and Shopping Cart"""
     use_model = None
+    counter_field = None
     object_alredy_added_text = None
     cannot_remove_text = None
 
     def _get_recipe(self):
         recipe = Recipe.objects.filter(id=self.kwargs.get('recipe_id')).first()
         if recipe is None:
-            raise ValidationError({'detail': 'The recipe does not exist'})
+            raise NotFound('The recipe does not exist')
         return recipe
 
     def get_queryset(self):
         recipe = self._get_recipe()
         return recipe.favorites.all()
 
+    def link_changed(self, delta):
+        """Called after the recipe has been added (1) or removed (-1)"""
+        change_counter(
+            Recipe, self.kwargs.get('recipe_id'), self.counter_field, delta
+        )
+
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        recipe_id = self.kwargs.get('recipe_id')
+        with transaction.atomic():
+            link_id = add_link(
+                self.use_model, request.user.id, 'recipe', recipe_id
+            )
+            if link_id is not None:
+                self.link_changed(1)
         recipe = self._get_recipe()
-        user = request.user
-        if self.use_model.objects.filter(recipe=recipe, user=user).exists():
+        if link_id is None:
             data = {'detail': self.object_alredy_added_text}
             return Response(data, status=status.HTTP_400_BAD_REQUEST, )
-        serializer.save(recipe=recipe, user=user)
+        serializer = self.get_serializer(
+            self.use_model(id=link_id, recipe=recipe, user=request.user)
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['delete'])
     def delete(self, request, *args, **kwargs):
-        recipe = self._get_recipe()
-        user = request.user
-        deleted_object = self.use_model.objects.filter(
-            recipe=recipe, user=user
-        ).first()
-        if deleted_object is None:
+        recipe_id = self.kwargs.get('recipe_id')
+        with transaction.atomic():
+            removed = remove_link(
+                self.use_model, request.user.id, 'recipe', recipe_id
+            )
+            if removed:
+                self.link_changed(-1)
+        if not removed:
+            self._get_recipe()
             data = {'detail': self.cannot_remove_text}
             return Response(data, status=status.HTTP_400_BAD_REQUEST, )
-        deleted_object.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@query_budget(5)
 class FavoriteViewSet(FavoriteAndShopCartMixin, ModelViewSet):
     """Favorite ViewSet"""
     serializer_class = FavoriteSerializer
     permission_classes = (permissions.IsAuthenticated,)
     pagination_class = None
     use_model = Favorite
+    counter_field = 'favorites_count'
     object_alredy_added_text = 'The recipe has already been added to favorites'
     cannot_remove_text = ('You cannot remove a recipe from favorites '
                           'that has not yet been added there')
 
 
+@query_budget(5)
 class ShoppingCartViewSet(FavoriteAndShopCartMixin, ModelViewSet):
     """Shopping cart ViewSet"""
     serializer_class = ShoppingCartSerializer
     permission_classes = (permissions.IsAuthenticated,)
     pagination_class = None
     use_model = ShoppingCart
+    counter_field = 'cart_count'
     object_alredy_added_text = ('he recipe has already been added '
                                 'to the shopping list')
     cannot_remove_text = ('You cannot remove something from your shopping '
                           'list that has not yet been added there.')
 
+    def link_changed(self, delta):
+        super().link_changed(delta)
+        invalidate_shopping_lists((self.request.user.id,))
+
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@renderer_classes(SHOPPING_LIST_RENDERERS)
 def download_shopping_cart(request):
-    """Download shopping cart api view"""
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={
-            'Content-Disposition':
-            'attachment; filename="somefilename.csv"'
-        },
-    )
-    return generate_file(request, response)
+    """Download shopping cart api view
+
+    The format is chosen by "?format=" or by the Accept header.
+    """
+    renderer = request.accepted_renderer
+    version = shopping_list_version(request.user.id)
+    etag = quote_etag(f'{version}-{renderer.format}')
+    if not_modified(request, etag):
+        response = HttpResponseNotModified(headers={'ETag': etag})
+    else:
+        key = f'shopping_list:{request.user.id}:{version}:{renderer.format}'
+        content = cache.get(key)
+        response_class = HttpResponse
+        if content is None:
+            content = cache_stream(
+                key, renderer.stream(*shopping_list(request.user))
+            )
+            response_class = StreamingHttpResponse
+        response = response_class(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+            headers={
+                'ETag': etag,
+                'Content-Disposition':
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            },
+        )
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
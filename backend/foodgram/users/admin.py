@@ -1,22 +1,26 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from meals.admin import CountedDeleteMixin
+
 from .models import Subscription, User
 
 
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(CountedDeleteMixin, UserAdmin):
     list_display = (
         'username',
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('username', 'email')
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(CountedDeleteMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'subscription_to_user',
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-17 06:31
+
+from django.db import migrations, models
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    """Keep the oldest of every duplicated subscription"""
+    Subscription = apps.get_model('users', 'Subscription')
+    duplicates = Subscription.objects.order_by().values(
+        'user', 'subscription_to_user'
+    ).annotate(
+        keep_id=models.Min('id'), count=models.Count('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates:
+        Subscription.objects.filter(
+            user=duplicate['user'],
+            subscription_to_user=duplicate['subscription_to_user']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_subscriptions, migrations.RunPython.noop
+        ),
+    ]
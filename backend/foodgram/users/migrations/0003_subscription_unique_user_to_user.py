@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_delete_duplicate_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'subscription_to_user'), name='unique_subscription_user_to_user'),
+        ),
+    ]
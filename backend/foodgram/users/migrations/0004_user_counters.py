@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-17 06:34
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes_count', 'meals', 'Recipe', 'author'),
+    ('followers_count', 'users', 'Subscription', 'subscription_to_user'),
+)
+
+
+def count_user_links(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for field, app_label, model_name, link in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        User.objects.update(**{field: Coalesce(models.Subquery(
+            model.objects.filter(**{link: models.OuterRef('pk')}).order_by()
+            .values(link).annotate(count=models.Count('pk'))
+            .values('count')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_subscription_unique_user_to_user'),
+        ('meals', '0011_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of users subscribed to the user', verbose_name='Followers'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of recipes of the user', verbose_name='Recipes'),
+        ),
+        migrations.RunPython(count_user_links, migrations.RunPython.noop),
+    ]
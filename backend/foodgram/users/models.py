@@ -40,6 +40,18 @@ class User(AbstractUser):
         verbose_name='Password',
         help_text='Password, maximum 150 characters'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Recipes',
+        help_text='Number of recipes of the user'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Followers',
+        help_text='Number of users subscribed to the user'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -74,3 +86,9 @@ class Subscription(models.Model):
         verbose_name = 'Subscription'
         verbose_name_plural = 'Subscriptions'
         ordering = ('id',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'subscription_to_user'),
+                name='unique_subscription_user_to_user'
+            ),
+        )
@@ -1,11 +1,10 @@
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
 
 from meals.models import Recipe
-from meals.utils import Base64ImageField
+from meals.utils import RecipeImageField
 
 from .models import Subscription, User
-from .utils import subscribed
+from .utils import annotate_subscriptions, subscribed
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -48,7 +47,7 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 
 class RecipeSerializerForSubscription(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField(variant='image_thumbnail')
 
     class Meta:
         model = Recipe
@@ -81,7 +80,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     )
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Subscription
@@ -97,19 +96,11 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         return subscribed(self, obj.subscription_to_user)
 
-    def get_recipes_count(self, obj):
-        return obj.subscription_to_user.recipes.count()
-
     def get_recipes(self, obj):
-        # Filtering if "recipes_limit" is present in the request
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit')
-        if not recipes_limit:
-            recipes = Recipe.objects.filter(author=obj.subscription_to_user)
-        else:
-            recipes = Recipe.objects.filter(
-                author=obj.subscription_to_user)[:int(recipes_limit)]
-        serializer = RecipeSerializerForSubscription(recipes, many=True)
+        # Recipes are preloaded and limited by "recipes_limit" in the view
+        serializer = RecipeSerializerForSubscription(
+            obj.subscription_to_user.limited_recipes, many=True
+        )
         return serializer.data
 
 
@@ -123,20 +114,9 @@ class SubscribeSerializer(serializers.ModelSerializer):
         fields = ('user_id', 'subscription_to_user_id')
 
     def to_representation(self, value):
+        value = annotate_subscriptions(
+            Subscription.objects.filter(id=value.id),
+            self.context.get('request').query_params.get('recipes_limit')
+        ).first()
         serializer = SubscriptionSerializer(value, context=self.context)
         return serializer.data
-
-    def validate(self, data):
-        user = User.objects.get(id=data.get('user_id'))
-        subscription_to_user = User.objects.get(
-            id=data.get('subscription_to_user_id')
-        )
-        if subscription_to_user == user:
-            data = {'detail': "You can't subscribe to yourself"}
-            raise ValidationError(data)
-        if Subscription.objects.filter(
-            user=user, subscription_to_user=subscription_to_user
-        ).exists():
-            data = {'detail': 'You are already following this user'}
-            raise ValidationError(data)
-        return data
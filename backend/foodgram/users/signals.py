@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from meals.utils import change_counter
+
+from .models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User, instance.subscription_to_user_id, 'followers_count', 1
+        )
@@ -0,0 +1,140 @@
+import json
+import logging
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from meals.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Product,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagRecipe
+)
+
+from .models import Subscription, User
+
+
+class QueryCountTests(TestCase):
+    """Lists run the same number of queries whatever their length"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='User', last_name='User', password='password'
+            )
+            for number in range(5)
+        ]
+        cls.user = cls.users[0]
+        tags = [
+            Tag.objects.create(
+                name=f'Tag {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                product=Product.objects.create(
+                    name=f'product{number}', measurement_unit='g'
+                ),
+                amount=100
+            )
+            for number in range(3)
+        ]
+        for author in cls.users[1:]:
+            Subscription.objects.create(
+                user=cls.user, subscription_to_user=author
+            )
+            for number in range(3):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Recipe {number}',
+                    image='recipes/images/a.png', text='Text',
+                    cooking_time=10
+                )
+                for tag in tags:
+                    TagRecipe.objects.create(recipe=recipe, tag=tag)
+                for ingredient in ingredients:
+                    IngredientRecipe.objects.create(
+                        recipe=recipe, ingredient=ingredient
+                    )
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertQueries(self, path, queries):
+        # The first request fills the caches of counts and catalogs
+        self.client.get(path)
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recipe_list(self):
+        data = self.assertQueries('/api/recipes/?limit=12', 4)
+        self.assertEqual(len(data['results']), 12)
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        data = self.assertQueries('/api/recipes/?limit=12', 3)
+        self.assertEqual(len(data['results']), 12)
+
+    def test_subscriptions(self):
+        data = self.assertQueries(
+            '/api/users/subscriptions/?recipes_limit=2', 3
+        )
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(
+            [len(author['recipes']) for author in data['results']],
+            [2] * 4
+        )
+        self.assertEqual(
+            [author['recipes_count'] for author in data['results']],
+            [3] * 4
+        )
+
+    def test_subscriptions_bad_recipes_limit(self):
+        for recipes_limit, shown in (('abc', 3), ('', 3), ('-1', 0)):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [len(author['recipes'])
+                     for author in response.json()['results']],
+                    [shown] * 4
+                )
+
+    def test_user_list(self):
+        data = self.assertQueries('/api/users/', 2)
+        self.assertEqual(len(data['results']), 5)
+
+    def test_unlogged_queries_are_not_fingerprinted(self):
+        logger = logging.getLogger('foodgram.queries')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.WARNING)
+        with mock.patch('foodgram.middleware.fingerprint') as fingerprint, \
+                mock.patch('foodgram.middleware.json') as dumps:
+            self.client.get('/api/recipes/')
+        fingerprint.assert_not_called()
+        dumps.dumps.assert_not_called()
+
+    def test_logged_queries(self):
+        with self.assertLogs('foodgram.queries', 'INFO') as logs:
+            self.client.get('/api/users/subscriptions/')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], '/api/users/subscriptions/')
+        self.assertIsInstance(record['duplicates'], dict)
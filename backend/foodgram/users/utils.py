@@ -1,12 +1,59 @@
+from django.db import models
+
+from meals.models import Recipe
+
 from .models import Subscription
 
 
+def get_subscriptions(context):
+    """Ids of the authors the requester follows, loaded once per request"""
+    if 'subscriptions' not in context:
+        user = context.get('request').user
+        context['subscriptions'] = (
+            set(
+                Subscription.objects.filter(user=user).values_list(
+                    'subscription_to_user_id', flat=True
+                )
+            )
+            if user.is_authenticated else set()
+        )
+    return context['subscriptions']
+
+
 def subscribed(serializer, user):
     """Check: user is subscribed"""
-    subscription_to_user = serializer.context.get("request").user
-    return (
-        subscription_to_user.is_authenticated
-        and Subscription.objects.filter(
-            user=user, subscription_to_user=subscription_to_user
-        ).exists()
+    return user.id in get_subscriptions(serializer.context)
+
+
+def parse_recipes_limit(value):
+    """Number of recipes to show per author, None (all) if not a number"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def annotate_subscriptions(queryset, recipes_limit=None):
+    """Preload authors, their recipes and recipes count for subscriptions"""
+    recipes = Recipe.objects.only(
+        'id', 'name', 'image', 'image_thumbnail', 'cooking_time', 'author_id'
     )
+    recipes_limit = parse_recipes_limit(recipes_limit)
+    if recipes_limit == 0:
+        recipes = recipes.none()
+    elif recipes_limit is not None:
+        # Top-N recipes per author in a single query
+        recipes = recipes.filter(
+            id__in=models.Subquery(
+                Recipe.objects.filter(
+                    author=models.OuterRef('author')
+                ).values('id')[:recipes_limit]
+            )
+        )
+    return queryset.select_related('subscription_to_user').prefetch_related(
+        models.Prefetch(
+            'subscription_to_user__recipes',
+            queryset=recipes,
+            to_attr='limited_recipes'
+        )
+    ).annotate(recipes_count=models.F('subscription_to_user__recipes_count'))
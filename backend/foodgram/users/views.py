@@ -1,11 +1,14 @@
 from django.contrib.auth import update_session_auth_hash
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from meals.pagination import PaginationWithLimit
+from foodgram.middleware import query_budget
+from meals.pagination import PaginationWithCursor, PaginationWithLimit
+from meals.utils import add_link, change_counter, remove_link
 
 from .models import Subscription, User
 from .serializers import (
@@ -15,8 +18,10 @@ from .serializers import (
     UserCreateSerializer,
     UserSerializer
 )
+from .utils import annotate_subscriptions
 
 
+@query_budget(list=5, retrieve=4, get_me_data=4)
 class UserViewSet(mixins.ListModelMixin,
                   mixins.CreateModelMixin,
                   mixins.RetrieveModelMixin,
@@ -25,7 +30,8 @@ class UserViewSet(mixins.ListModelMixin,
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (permissions.AllowAny,)
-    pagination_class = PaginationWithLimit
+    pagination_class = PaginationWithCursor
+    ordering = ('id',)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -64,6 +70,7 @@ def change_password(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(6)
 class SubscriptionViewSet(mixins.ListModelMixin,
                           viewsets.GenericViewSet):
     """Subscription ViewSet"""
@@ -74,9 +81,13 @@ class SubscriptionViewSet(mixins.ListModelMixin,
     pagination_class = PaginationWithLimit
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        return annotate_subscriptions(
+            Subscription.objects.filter(user=self.request.user),
+            self.request.query_params.get('recipes_limit')
+        )
 
 
+@query_budget(8)
 class SubscribeViewSet(ModelViewSet):
     """Subscribe ViewSet"""
     serializer_class = SubscribeSerializer
@@ -90,30 +101,38 @@ class SubscribeViewSet(ModelViewSet):
         return subscription_to_user
 
     def create(self, request, *args, **kwargs):
-        user = request.user
-        subscription_to_user = self._get_user()
-        data = {
-            'user_id': user.id,
-            'subscription_to_user_id': subscription_to_user.id,
-        }
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save(user=user, subscription_to_user=subscription_to_user)
+        user_id = int(self.kwargs.get('user_id'))
+        if user_id == request.user.id:
+            data = {'detail': "You can't subscribe to yourself"}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST, )
+        with transaction.atomic():
+            subscription_id = add_link(
+                Subscription, request.user.id, 'subscription_to_user', user_id
+            )
+            if subscription_id is not None:
+                change_counter(User, user_id, 'followers_count', 1)
+        if subscription_id is None:
+            self._get_user()
+            data = {'detail': 'You are already following this user'}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST, )
+        serializer = self.get_serializer(Subscription(id=subscription_id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=["delete"])
     def delete(self, request, *args, **kwargs):
         """Delete a subscription"""
-        subscription_to_user = self._get_user()
-        user = request.user
-        subscription = Subscription.objects.filter(
-            user=user, subscription_to_user=subscription_to_user
-        ).first()
-        if subscription is None:
+        user_id = self.kwargs.get('user_id')
+        with transaction.atomic():
+            removed = remove_link(
+                Subscription, request.user.id, 'subscription_to_user', user_id
+            )
+            if removed:
+                change_counter(User, user_id, 'followers_count', -1)
+        if not removed:
+            self._get_user()
             data = {
                 'detail':
                 'You cannot delete a subscription you are not subscribed to'
             }
             return Response(data, status=status.HTTP_400_BAD_REQUEST, )
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)